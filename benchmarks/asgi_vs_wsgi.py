@@ -0,0 +1,91 @@
+"""
+Load comparison of the two entry points: gunicorn sync workers (wsgi.py) against
+uvicorn workers (asgi.py), with the same number of processes, at increasing numbers
+of concurrent connections on /people/<id> and /people?limit=20.
+
+    python benchmarks/asgi_vs_wsgi.py [--workers 2] [--connections 10,100,500] [--duration 10]
+
+By default it seeds its own throwaway SQLite database. With --database-url it runs
+against an existing, migrated database instead (PostgreSQL is where the difference
+shows: every query waits on the network, which blocks a sync worker but only one
+coroutine of an async one). Needs gunicorn, uvicorn and asyncpg or aiosqlite.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadgen import load, serve  # noqa: E402
+
+SERVERS = {
+    "wsgi (gunicorn sync)": lambda workers, port: [
+        sys.executable, "-m", "gunicorn", "wsgi", "--chdir", os.path.join(ROOT, "src"),
+        "--workers", str(workers), "--bind", f"127.0.0.1:{port}", "--backlog", "2048", "--log-level", "warning",
+    ],
+    "asgi (uvicorn)": lambda workers, port: [
+        sys.executable, "-m", "uvicorn", "asgi:app", "--app-dir", os.path.join(ROOT, "src"),
+        "--workers", str(workers), "--port", str(port), "--backlog", "2048", "--log-level", "warning",
+    ],
+}
+
+
+def seed(database_url, rows):
+    os.environ["DATABASE_URL"] = database_url
+    from sqlalchemy import insert
+    from app import app
+    from models import db, People, GenderEnum
+
+    genders = list(GenderEnum)
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(People.__table__), [
+            {
+                "full_name": f"Person {i}",
+                "gender": genders[i % len(genders)],
+                "description": "A long time ago in a galaxy far, far away...",
+                "height": 1.5 + (i % 60) / 100,
+                "url": f"https://swapi.dev/api/people/{i}",
+            }
+            for i in range(rows)
+        ])
+        db.session.commit()
+
+
+def benchmark(name, command, database_url, connections, duration, rows):
+    env = dict(os.environ, DATABASE_URL=database_url, DB_POOL_PRESET="production")
+    with serve(command, PORT, env, "/people/1"):
+        paths = [f"/people/{1 + i * 7919 % rows}" for i in range(500)] + ["/people?limit=20"]
+        for count in connections:
+            summary = load("127.0.0.1", PORT, paths, count, duration).summary()
+            print(
+                f"{name:22} {count:6d} {summary['rps']:10.1f} {summary['p50_ms']:9.2f} "
+                f"{summary['p99_ms']:9.2f} {summary['errors']:7d}",
+                flush=True,
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--connections", default="10,100,500", help="comma separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per concurrency level")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--port", type=int, default=8731)
+    parser.add_argument("--database-url", help="existing database to use instead of a throwaway SQLite one")
+    options = parser.parse_args()
+    PORT = options.port
+
+    database_url = options.database_url
+    if database_url is None:
+        database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench-asgi-'), 'bench.db')}"
+        seed(database_url, options.rows)
+
+    connections = [int(count) for count in options.connections.split(",")]
+    print(f"workers: {options.workers}  duration: {options.duration}s per level  database: {database_url.split('@')[-1]}")
+    print(f"{'server':22} {'conns':>6} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, command in SERVERS.items():
+        benchmark(name, command(options.workers, PORT), database_url, connections, options.duration, options.rows)
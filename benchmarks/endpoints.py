@@ -0,0 +1,297 @@
+"""
+Endpoint benchmark suite: seeds a catalog, serves the app with gunicorn and loads
+every kind of route (lists, details, search, favorites, single and batch add/delete,
+user and catalog create/delete, bulk imports), reporting p50/p95/p99 latency,
+throughput and SQL statements per request.
+
+    python benchmarks/endpoints.py [--people 100000] [--users 10000] [--favorites 50]
+    python benchmarks/endpoints.py --save-baseline baseline.json   # store the results
+    python benchmarks/endpoints.py --baseline baseline.json        # compare, exit 1 on regression
+
+No baseline is kept in the repository: latencies only compare on the same machine, so
+the gate stores one there first (from the target branch, say) and compares against it.
+Without --baseline the results are only printed; a --baseline file that does not exist
+is an error, never a pass.
+
+The database is a throwaway SQLite file built with the migrations and seeded with
+`flask seed`'s loader, unless --database-url points to an existing database (then
+--seed reseeds it first). The server runs a single gthread worker so /metrics sees
+every request; the statements per request come from there. Requests are generated from a fixed random seed, so two
+runs with the same options send the same requests.
+
+The write scenarios create rows named with WRITTEN_PREFIX and the delete ones remove
+exactly those, so an existing database is left as it was found (any leftovers of an
+interrupted run are removed before and after the run). A delete scenario runs out of
+rows when the deletes outpace the creates before it, the extra ones answer 404.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import urllib.request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadgen import load, serve  # noqa: E402
+
+# Names of the rows the write scenarios create, and delete afterwards
+WRITTEN_PREFIX = "bench-write"
+BULK_ROWS = 100
+# Statements per request vary a little with cache hits, an N+1 adds at least one
+QUERIES_TOLERANCE = 0.5
+SQL_METRIC = re.compile(
+    r'^http_request_sql_statements_(sum|count)\{method="([^"]*)",route="([^"]*)",pid="\d+"\} (\S+)$', re.M
+)
+
+
+def seed(options):
+    from flask_migrate import Migrate, upgrade
+    from app import app
+    from models import db
+    from seed import seed_catalog
+
+    Migrate(app, db)
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, "migrations"))
+        seed_catalog(
+            options.users, options.people, options.planets, options.vehicles, options.favorites, reset=options.seed,
+        )
+
+
+def scenarios(options):
+    rng = random.Random(42)
+    users = [rng.randint(1, options.users) for _ in range(1000)]
+    words = [f"Person {rng.randint(1, options.people)}" for _ in range(200)]
+
+    def spare(user, count):
+        # A target that is not among the seeded favorites of the user (see seed.favorite_target)
+        return (user * 7919 + options.favorites) % count + 1
+
+    add_delete = []
+    batch = []
+    for user in users:
+        people_id = spare(user, options.people)
+        add_delete += [("POST", f"/users/{user}/favorite/people/{people_id}"), ("DELETE", f"/users/{user}/favorite/people/{people_id}")]
+        body = json.dumps({"items": [
+            {"type": "planet", "id": spare(user, options.planets)},
+            {"type": "vehicle", "id": spare(user, options.vehicles)},
+        ]}).encode("utf-8")
+        batch += [("POST", f"/users/{user}/favorites:batch", body), ("DELETE", f"/users/{user}/favorites:batch", body)]
+
+    return {
+        "users list": ["/users?limit=100"],
+        "people list": ["/people?limit=100", "/people?limit=100&fields=full_name"],
+        "planets list": ["/planets?limit=100"],
+        "vehicles list": ["/vehicles?limit=100"],
+        "user detail": [f"/user/{user}" for user in users],
+        "people detail": [f"/people/{rng.randint(1, options.people)}" for _ in range(1000)],
+        "planet detail": [f"/planets/{rng.randint(1, options.planets)}" for _ in range(1000)],
+        "vehicle detail": [f"/vehicles/{rng.randint(1, options.vehicles)}" for _ in range(1000)],
+        "search": [f"/search?q={word.replace(' ', '+')}&limit=10" for word in words],
+        "user favorites": [f"/users/{user}/favorites" for user in users],
+        "popular": ["/popular/people?limit=10", "/popular/planets?limit=10", "/popular/vehicles?limit=10"],
+        # Each add is followed by its delete, concurrent connections may swap them (404/409)
+        "favorite add/delete": add_delete,
+        "favorites batch": batch,
+        # Write scenarios, each create gets a new name; the deletes are built once the creates ran
+        "user create": created_users(),
+        "catalog create": created_catalog(),
+        "bulk import": bulk_imports(),
+        "user delete": lambda: [("DELETE", f"/user/{theid}") for theid in written_ids(os.environ["DATABASE_URL"])["user"]],
+        "catalog delete": lambda: [
+            ("DELETE", f"/{CATALOG_ROUTES[table]}/{theid}")
+            for table, ids in written_ids(os.environ["DATABASE_URL"]).items() if table != "user" for theid in ids
+        ],
+    }
+
+
+# Table -> route prefix of the catalog endpoints
+CATALOG_ROUTES = {"people": "people", "planet": "planets", "vehicle": "vehicles"}
+
+
+def _catalog_row(table, name):
+    row = {"description": "-", "url": "-"}
+    if table == "people":
+        row.update(full_name=name, gender="FEMALE")
+    else:
+        row.update(name=name)
+    return row
+
+
+def created_users():
+    for i in itertools.count():
+        name = f"{WRITTEN_PREFIX}-{i}"
+        body = {"email": f"{name}@example.com", "username": name, "name": name, "password": "-"}
+        yield ("POST", "/user", json.dumps(body).encode("utf-8"))
+
+
+def created_catalog():
+    for i in itertools.count():
+        for table, route in CATALOG_ROUTES.items():
+            yield ("POST", f"/{route}", json.dumps(_catalog_row(table, f"{WRITTEN_PREFIX}-{i}")).encode("utf-8"))
+
+
+def bulk_imports():
+    for i in itertools.count():
+        for table, route in CATALOG_ROUTES.items():
+            rows = (_catalog_row(table, f"{WRITTEN_PREFIX}-bulk-{i}-{row}") for row in range(BULK_ROWS))
+            yield ("POST", f"/{route}/bulk", "\n".join(json.dumps(row) for row in rows).encode("utf-8"))
+
+
+def _written(database_url):
+    from sqlalchemy import create_engine
+    from models import User, People, Planet, Vehicle
+
+    columns = [User.username, People.full_name, Planet.name, Vehicle.name]
+    return create_engine(database_url), [(column.class_, column) for column in columns]
+
+
+def written_ids(database_url):
+    """Ids of the rows the write scenarios created, by table."""
+    from sqlalchemy import select
+
+    engine, models = _written(database_url)
+    with engine.connect() as connection:
+        ids = {
+            model.__table__.name: connection.execute(
+                select(model.id).where(column.startswith(WRITTEN_PREFIX)).order_by(model.id)
+            ).scalars().all()
+            for model, column in models
+        }
+    engine.dispose()
+    return ids
+
+
+def remove_written(database_url):
+    from sqlalchemy import delete
+
+    engine, models = _written(database_url)
+    with engine.begin() as connection:
+        for model, column in models:
+            connection.execute(delete(model).where(column.startswith(WRITTEN_PREFIX)))
+    engine.dispose()
+
+
+def sql_counts(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+        text = response.read().decode("utf-8")
+    counts = {}
+    for kind, method, route, value in SQL_METRIC.findall(text):
+        if route != "/metrics":
+            counts[(kind, method, route)] = float(value)
+    return counts
+
+
+def queries_per_request(before, after):
+    delta = {key: value - before.get(key, 0.0) for key, value in after.items()}
+    statements = sum(value for (kind, _, _), value in delta.items() if kind == "sum")
+    requests = sum(value for (kind, _, _), value in delta.items() if kind == "count")
+    return round(statements / requests, 2) if requests else 0.0
+
+
+def run(options, database_url):
+    command = [
+        sys.executable, "-m", "gunicorn", "wsgi", "--chdir", os.path.join(ROOT, "src"),
+        "--workers", "1", "--threads", str(options.threads), "--worker-class", "gthread",
+        "--bind", f"127.0.0.1:{options.port}", "--log-level", "warning",
+    ]
+    env = dict(os.environ, DATABASE_URL=database_url, METRICS_ENABLED="1", SLOW_REQUEST_MS="0")
+    results = {}
+    remove_written(database_url)
+    with serve(command, options.port, env):
+        for name, requests in scenarios(options).items():
+            if options.only and not re.search(options.only, name):
+                continue
+            if callable(requests):
+                if options.only and not re.search(options.only, name.replace("delete", "create")):
+                    print(f"{name:20} skipped, it deletes what its create scenario made", flush=True)
+                    continue
+                deletes = requests()
+                if not deletes:
+                    print(f"{name:20} skipped, its create scenario made no rows", flush=True)
+                    continue
+                # An iterator, so the measured run goes on after the warm up instead of deleting the same rows
+                # again; once they are all gone the deletes repeat and answer 404
+                requests = itertools.chain(deletes, itertools.cycle(deletes))
+            load("127.0.0.1", options.port, requests, options.connections, options.warmup)
+            before = sql_counts(options.port)
+            summary = load("127.0.0.1", options.port, requests, options.connections, options.duration).summary()
+            summary["queries_per_request"] = queries_per_request(before, sql_counts(options.port))
+            results[name] = summary
+            print(
+                f"{name:20} {summary['rps']:9.1f} {summary['p50_ms']:9.2f} {summary['p95_ms']:9.2f} "
+                f"{summary['p99_ms']:9.2f} {summary['queries_per_request']:7.2f}  {summary['statuses']}",
+                flush=True,
+            )
+    remove_written(database_url)
+    return results
+
+
+def regressions(results, baseline, tolerance):
+    found = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            found.append(f"{name}: p95 {previous['p95_ms']} ms -> {current['p95_ms']} ms")
+        if current["rps"] < previous["rps"] * (1 - tolerance):
+            found.append(f"{name}: throughput {previous['rps']} -> {current['rps']} req/s")
+        if current["queries_per_request"] > previous["queries_per_request"] + QUERIES_TOLERANCE:
+            found.append(
+                f"{name}: queries per request {previous['queries_per_request']} -> {current['queries_per_request']}"
+            )
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--people", type=int, default=100000)
+    parser.add_argument("--planets", type=int, default=10000)
+    parser.add_argument("--vehicles", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--favorites", type=int, default=50, help="favorites per user")
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads of the single worker")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds of warm up per scenario")
+    parser.add_argument("--only", help="regular expression of the scenarios to run")
+    parser.add_argument("--port", type=int, default=8732)
+    parser.add_argument("--database-url", help="existing database to use instead of a throwaway SQLite one")
+    parser.add_argument("--seed", action="store_true", help="seed the --database-url database first")
+    parser.add_argument("--baseline", help="results to compare with, exit 1 on a regression")
+    parser.add_argument("--save-baseline", metavar="PATH", help="store the results as a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95/throughput change")
+    options = parser.parse_args()
+    if options.baseline is not None and not os.path.exists(options.baseline):
+        parser.error(f"no baseline at {options.baseline}, store one with --save-baseline {options.baseline}")
+
+    database_url = options.database_url
+    if database_url is None:
+        database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench-endpoints-'), 'bench.db')}"
+    os.environ["DATABASE_URL"] = database_url
+    if options.database_url is None or options.seed:
+        seed(options)
+
+    print(f"{'scenario':20} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'sql/req':>7}  statuses")
+    results = run(options, database_url)
+
+    if options.save_baseline:
+        with open(options.save_baseline, "w") as baseline_file:
+            json.dump({"options": vars(options), "results": results}, baseline_file, indent=2)
+        print(f"baseline saved to {options.save_baseline}")
+    if options.baseline is not None:
+        with open(options.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+        found = regressions(results, baseline, options.tolerance)
+        for regression in found:
+            print(f"REGRESSION {regression}")
+        if found:
+            sys.exit(1)
+        print(f"no regressions against {options.baseline}")
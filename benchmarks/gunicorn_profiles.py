@@ -0,0 +1,119 @@
+"""
+Comparison of the worker models of gunicorn.conf.py (GUNICORN_PROFILE=sync, gthread
+and gevent, plus gthread without preload_app) under the same process count: req/s
+and latency of a mixed read workload at increasing concurrency, and the memory of
+the master plus its workers (proportional set size, so shared pages count once).
+
+    python benchmarks/gunicorn_profiles.py [--workers 2] [--connections 10,50,200] [--duration 10]
+
+It seeds a throwaway SQLite database unless --database-url points to an existing,
+migrated one (--seed reseeds it). Local SQLite answers in microseconds; the profiles
+meant for I/O bound traffic show their difference against a networked PostgreSQL.
+The gevent profile is skipped when gevent is not installed. Memory is read from
+/proc, on other systems it is reported as 0.
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from endpoints import seed, scenarios  # noqa: E402
+from loadgen import load, serve  # noqa: E402
+
+# name -> (GUNICORN_PROFILE, extra environment)
+PROFILES = {
+    "sync": ("sync", {}),
+    "gthread": ("gthread", {}),
+    "gthread no preload": ("gthread", {"GUNICORN_PRELOAD": "0"}),
+    "gevent": ("gevent", {}),
+}
+WORKLOAD = ("user detail", "people detail", "people list", "user favorites")
+
+
+def children(pid):
+    found = []
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as stat_file:
+                    # The name is in parentheses and may contain spaces, the parent pid follows it
+                    parent = int(stat_file.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            if parent == pid:
+                found.append(int(entry))
+    return found
+
+
+def pss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as smaps:
+            for line in smaps:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def benchmark(name, profile, extra, options, database_url, requests):
+    command = [
+        sys.executable, "-m", "gunicorn", "-c", os.path.join(ROOT, "gunicorn.conf.py"), "wsgi",
+        "--bind", f"127.0.0.1:{options.port}", "--backlog", "2048", "--log-level", "warning",
+    ]
+    env = dict(
+        os.environ, DATABASE_URL=database_url, GUNICORN_PROFILE=profile, WEB_CONCURRENCY=str(options.workers),
+        DB_POOL_PRESET="production", METRICS_ENABLED="0", SLOW_REQUEST_MS="0", **extra,
+    )
+    with serve(command, options.port, env) as server:
+        load("127.0.0.1", options.port, requests, max(options.connections), options.warmup)
+        memory = pss_mb(server.pid) + sum(pss_mb(pid) for pid in children(server.pid))
+        for count in options.connections:
+            summary = load("127.0.0.1", options.port, requests, count, options.duration).summary()
+            print(
+                f"{name:20} {count:6d} {summary['rps']:10.1f} {summary['p50_ms']:9.2f} "
+                f"{summary['p99_ms']:9.2f} {summary['errors']:7d} {memory:9.1f}",
+                flush=True,
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=2, help="processes of every profile (WEB_CONCURRENCY)")
+    parser.add_argument("--connections", default="10,50,200", help="comma separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per concurrency level")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds of warm up per profile")
+    parser.add_argument("--profiles", default=",".join(PROFILES), help="comma separated profiles to run")
+    parser.add_argument("--people", type=int, default=100000)
+    parser.add_argument("--planets", type=int, default=10000)
+    parser.add_argument("--vehicles", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--favorites", type=int, default=20, help="favorites per user")
+    parser.add_argument("--port", type=int, default=8733)
+    parser.add_argument("--database-url", help="existing database to use instead of a throwaway SQLite one")
+    parser.add_argument("--seed", action="store_true", help="seed the --database-url database first")
+    options = parser.parse_args()
+    options.connections = [int(count) for count in options.connections.split(",")]
+
+    database_url = options.database_url
+    if database_url is None:
+        database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench-gunicorn-'), 'bench.db')}"
+    os.environ["DATABASE_URL"] = database_url
+    if options.database_url is None or options.seed:
+        seed(options)
+
+    generated = scenarios(options)
+    requests = [request for name in WORKLOAD for request in generated[name]]
+    print(f"workers: {options.workers}  duration: {options.duration}s per level  database: {database_url.split('@')[-1]}")
+    print(f"{'profile':20} {'conns':>6} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7} {'PSS MB':>9}")
+    for name in options.profiles.split(","):
+        profile, extra = PROFILES[name]
+        if profile == "gevent" and importlib.util.find_spec("gevent") is None:
+            print(f"{name:20} skipped, gevent is not installed")
+            continue
+        benchmark(name, profile, extra, options, database_url, requests)
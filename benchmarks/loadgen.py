@@ -0,0 +1,147 @@
+"""
+Minimal HTTP/1.1 load generator used by the benchmarks.
+
+Every connection is a coroutine that sends requests back to back, reusing the socket
+while the server keeps it alive and reconnecting when it closes it (gunicorn sync
+workers close after each response). A request is a path (GET) or a (method, path)
+or (method, path, JSON body bytes) tuple.
+"""
+import asyncio
+import contextlib
+import itertools
+import statistics
+import subprocess
+import time
+import urllib.request
+
+
+class LoadResult:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+        self.elapsed = 0.0
+
+    @property
+    def requests(self):
+        return len(self.latencies)
+
+    def percentile(self, percent):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+        return ordered[index] * 1000
+
+    def summary(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "rps": round(self.requests / self.elapsed, 1) if self.elapsed else 0.0,
+            "mean_ms": round(statistics.fmean(self.latencies) * 1000, 2) if self.latencies else 0.0,
+            "p50_ms": round(self.percentile(50), 2),
+            "p95_ms": round(self.percentile(95), 2),
+            "p99_ms": round(self.percentile(99), 2),
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+        }
+
+
+async def _read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ", 2)[1])
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    if "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif status not in (204, 304):
+        await reader.read()
+        return status, False
+    return status, headers.get("connection", "").lower() != "close"
+
+
+def _encode(host, port, item, headers):
+    if isinstance(item, str):
+        item = ("GET", item)
+    method, path, body = (*item, b"")[:3]
+    if body:
+        headers += f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+    elif method != "GET":
+        headers += "Content-Length: 0\r\n"
+    return f"{method} {path} HTTP/1.1\r\nHost: {host}:{port}\r\n{headers}\r\n".encode("latin-1") + body
+
+
+async def _connection(host, port, paths, deadline, result, headers):
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        request = _encode(host, port, next(paths), headers)
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(request)
+            status, keep_alive = await _read_response(reader)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            result.errors += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            await asyncio.sleep(0.01)
+            continue
+        result.latencies.append(time.perf_counter() - start)
+        result.statuses[status] = result.statuses.get(status, 0) + 1
+        if not keep_alive:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(host, port, paths, connections, duration, headers=None):
+    """Sends the requests in paths (cycled) over the given number of connections for duration seconds."""
+    result = LoadResult()
+    paths = itertools.cycle(paths)
+    extra_headers = "".join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(
+        _connection(host, port, paths, deadline, result, extra_headers) for _ in range(connections)
+    ))
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def load(host, port, paths, connections, duration, headers=None):
+    return asyncio.run(run_load(host, port, paths, connections, duration, headers))
+
+
+def wait_until_ready(port, path="/", timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"The server on port {port} did not start")
+
+
+@contextlib.contextmanager
+def serve(command, port, env, ready_path="/"):
+    """Runs a server command until the block exits."""
+    server = subprocess.Popen(command, env=env)
+    try:
+        wait_until_ready(port, ready_path)
+        yield server
+    finally:
+        server.terminate()
+        server.wait()
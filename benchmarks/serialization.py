@@ -0,0 +1,79 @@
+"""
+Serialization benchmark: legacy ORM objects + serialize() + stdlib jsonify against
+column rows + RowSerializer + the app JSON provider, on a 10k row /people response.
+
+    python benchmarks/serialization.py [--rows 10000] [--repeat 20]
+
+It uses its own throwaway SQLite database, never DATABASE_URL.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix="bench-serialization-"), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from sqlalchemy import insert, select  # noqa: E402
+from app import app  # noqa: E402
+from models import db, People, GenderEnum  # noqa: E402
+from serializers import row_serializer  # noqa: E402
+
+
+def seed(rows):
+    genders = list(GenderEnum)
+    db.session.execute(insert(People.__table__), [
+        {
+            "full_name": f"Person {i}",
+            "gender": genders[i % len(genders)],
+            "description": "A long time ago in a galaxy far, far away... " * 8,
+            "height": 1.5 + (i % 60) / 100,
+            "url": f"https://swapi.dev/api/people/{i}",
+        }
+        for i in range(rows)
+    ])
+    db.session.commit()
+
+
+def legacy():
+    peoples = db.session.execute(select(People).limit(LIMIT)).scalars().all()
+    payload = json.dumps(list(map(lambda item: item.serialize(), peoples)), default=str)
+    db.session.expunge_all()
+    return payload
+
+
+def rows():
+    serializer = row_serializer(People)
+    return app.json.dumps_bytes(serializer.many(db.session.execute(serializer.select().limit(LIMIT))))
+
+
+def measure(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    options = parser.parse_args()
+    LIMIT = options.rows
+
+    with app.app_context():
+        db.create_all()
+        seed(options.rows)
+        baseline = measure(legacy, options.repeat)
+        current = measure(rows, options.repeat)
+        print(f"rows: {options.rows}  json provider: {type(app.json).__name__}")
+        print(f"ORM + serialize() + json.dumps : {baseline:8.1f} ms")
+        print(f"rows + RowSerializer + provider: {current:8.1f} ms")
+        print(f"speedup                        : {baseline / current:8.1f}x")
+    os.remove(DB_PATH)
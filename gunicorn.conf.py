@@ -0,0 +1,101 @@
+"""
+Gunicorn settings for src/wsgi.py:
+
+    gunicorn -c gunicorn.conf.py wsgi
+
+The app is imported once in the master (preload_app) and the workers are forked from
+it, so the modules and a CATALOG_SNAPSHOT share their memory pages copy-on-write
+instead of being loaded again by every worker. Each worker drops the
+database connections it inherited right after the fork.
+
+GUNICORN_PROFILE picks the worker model, sized from the CPUs of the container:
+
+    sync     2 * CPUs + 1 processes, one request at a time each
+    gthread  CPUs + 1 processes with GUNICORN_THREADS threads (default 4), the default:
+             a thread waiting on the database lets the others run
+    gevent   CPUs processes with GUNICORN_WORKER_CONNECTIONS greenlets (default 100), for
+             many slow concurrent requests; needs gevent, and psycogreen with psycopg2
+
+The CPUs are the ones the container may use: its cgroup CPU quota (cpu.max, or
+cpu.cfs_quota_us on cgroup v1) rounded up, never more than the CPUs it can run on.
+WEB_CONCURRENCY overrides the number of processes, as on Heroku and Render, and
+GUNICORN_PRELOAD=0 turns preloading off. Keep the threads or greenlets of a worker
+within DB_POOL_SIZE + DB_MAX_OVERFLOW, the requests above that wait for a connection.
+"""
+import gc
+import math
+import os
+
+PROFILES = ("sync", "gthread", "gevent")
+profile = os.getenv("GUNICORN_PROFILE", "gthread")
+if profile not in PROFILES:
+    raise ValueError(f"GUNICORN_PROFILE must be one of: {', '.join(PROFILES)}")
+
+if profile == "gevent":
+    # Patched before the preloaded app creates its locks and sockets
+    from gevent import monkey
+    monkey.patch_all()
+    try:
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    except ImportError:
+        pass
+
+
+def cgroup_cpu_quota():
+    """CPUs allowed by the cgroup quota, None when there is no quota."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as cpu_max:
+            quota, period = cpu_max.read().split()
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as quota_file, \
+                    open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as period_file:
+                quota, period = quota_file.read().strip(), period_file.read().strip()
+        except OSError:
+            return None
+    if quota in ("max", "-1"):
+        return None
+    return max(1, math.ceil(int(quota) / int(period)))
+
+
+def cpu_count():
+    # CPUs this process may run on, not the ones of the host: sched_getaffinity ignores
+    # the CPU quota that containers usually get
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    quota = cgroup_cpu_quota()
+    return cpus if quota is None else min(cpus, quota)
+
+
+cpus = cpu_count()
+chdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+preload_app = os.getenv("GUNICORN_PRELOAD", "1").lower() in ("1", "true", "yes", "on")
+worker_class = profile
+if profile == "sync":
+    workers = 2 * cpus + 1
+elif profile == "gthread":
+    workers = cpus + 1
+    threads = int(os.getenv("GUNICORN_THREADS", 4))
+else:
+    workers = cpus
+    worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 100))
+workers = int(os.getenv("WEB_CONCURRENCY", workers))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+keepalive = 5
+
+
+def when_ready(server):
+    # The collector skips the objects of the preloaded app, so it does not write to
+    # their pages and they stay shared with the workers
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from app import app
+    from pool import dispose_after_fork
+
+    dispose_after_fork(app)
@@ -0,0 +1,38 @@
+"""unique favorite indexes
+
+Revision ID: 5c1e8f2a9b3d
+Revises: 97447e0297b7
+Create Date: 2026-10-18 09:12:41.503318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1e8f2a9b3d'
+down_revision = '97447e0297b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Remove duplicated favorites (keeping the oldest one) so the unique indexes can be built
+    op.execute(
+        "DELETE FROM favorite WHERE id NOT IN ("
+        "SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM favorite "
+        "GROUP BY user_id, people_id, planet_id, vehicle_id) AS keep)"
+    )
+    with op.batch_alter_table('favorite', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_favorite_user_id'), ['user_id'], unique=False)
+        batch_op.create_index('ix_favorite_user_people', ['user_id', 'people_id'], unique=True)
+        batch_op.create_index('ix_favorite_user_planet', ['user_id', 'planet_id'], unique=True)
+        batch_op.create_index('ix_favorite_user_vehicle', ['user_id', 'vehicle_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('favorite', schema=None) as batch_op:
+        batch_op.drop_index('ix_favorite_user_vehicle')
+        batch_op.drop_index('ix_favorite_user_planet')
+        batch_op.drop_index('ix_favorite_user_people')
+        batch_op.drop_index(batch_op.f('ix_favorite_user_id'))
@@ -0,0 +1,71 @@
+"""full text search indexes
+
+Revision ID: a7d4e9c2f610
+Revises: 5c1e8f2a9b3d
+Create Date: 2026-10-18 11:37:05.218846
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d4e9c2f610'
+down_revision = '5c1e8f2a9b3d'
+branch_labels = None
+depends_on = None
+
+# table -> searchable columns, most relevant first (must match SEARCH_TARGETS in src/search.py)
+SEARCH_COLUMNS = {
+    'people': ('full_name', 'description'),
+    'planet': ('name', 'climate', 'description'),
+    'vehicle': ('name', 'model', 'description'),
+}
+
+
+def pg_vector(columns):
+    weights = ('A', 'B', 'C')
+    return ' || '.join(
+        f"setweight(to_tsvector('simple', coalesce({column}, '')), '{weights[min(i, 2)]}')"
+        for i, column in enumerate(columns)
+    )
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for table, columns in SEARCH_COLUMNS.items():
+        if dialect == 'postgresql':
+            op.execute(f'CREATE INDEX ix_{table}_search ON {table} USING GIN (({pg_vector(columns)}))')
+        elif dialect == 'sqlite':
+            names = ', '.join(columns)
+            new_values = ', '.join(f'new.{column}' for column in columns)
+            old_values = ', '.join(f'old.{column}' for column in columns)
+            op.execute(
+                f"CREATE VIRTUAL TABLE {table}_fts USING fts5({names}, content='{table}', "
+                f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+            )
+            op.execute(
+                f'CREATE TRIGGER {table}_fts_ai AFTER INSERT ON {table} BEGIN '
+                f'INSERT INTO {table}_fts(rowid, {names}) VALUES (new.id, {new_values}); END'
+            )
+            op.execute(
+                f'CREATE TRIGGER {table}_fts_ad AFTER DELETE ON {table} BEGIN '
+                f"INSERT INTO {table}_fts({table}_fts, rowid, {names}) VALUES ('delete', old.id, {old_values}); END"
+            )
+            op.execute(
+                f'CREATE TRIGGER {table}_fts_au AFTER UPDATE ON {table} BEGIN '
+                f"INSERT INTO {table}_fts({table}_fts, rowid, {names}) VALUES ('delete', old.id, {old_values}); "
+                f'INSERT INTO {table}_fts(rowid, {names}) VALUES (new.id, {new_values}); END'
+            )
+            op.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table in SEARCH_COLUMNS:
+        if dialect == 'postgresql':
+            op.execute(f'DROP INDEX ix_{table}_search')
+        elif dialect == 'sqlite':
+            for trigger in ('ai', 'ad', 'au'):
+                op.execute(f'DROP TRIGGER {table}_fts_{trigger}')
+            op.execute(f'DROP TABLE {table}_fts')
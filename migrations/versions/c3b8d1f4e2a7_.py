@@ -0,0 +1,48 @@
+"""favorite counters
+
+Revision ID: c3b8d1f4e2a7
+Revises: a7d4e9c2f610
+Create Date: 2026-10-18 14:02:17.640215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3b8d1f4e2a7'
+down_revision = 'a7d4e9c2f610'
+branch_labels = None
+depends_on = None
+
+# counter kind -> favorite column (must match FAVORITE_TARGETS in src/favorites.py)
+COUNTED_COLUMNS = {
+    'people': 'people_id',
+    'planet': 'planet_id',
+    'vehicle': 'vehicle_id',
+}
+
+
+def upgrade():
+    op.create_table('favorite_counter',
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('target_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('kind', 'target_id')
+    )
+    with op.batch_alter_table('favorite_counter', schema=None) as batch_op:
+        batch_op.create_index('ix_favorite_counter_rank', ['kind', 'total', 'target_id'], unique=False)
+
+    # Counters of the favorites that already exist
+    for kind, column in COUNTED_COLUMNS.items():
+        op.execute(
+            f"INSERT INTO favorite_counter (kind, target_id, total) "
+            f"SELECT '{kind}', {column}, COUNT(*) FROM favorite WHERE {column} IS NOT NULL GROUP BY {column}"
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('favorite_counter', schema=None) as batch_op:
+        batch_op.drop_index('ix_favorite_counter_rank')
+
+    op.drop_table('favorite_counter')
@@ -0,0 +1,30 @@
+"""table versions
+
+Revision ID: d03c6aa64f5b
+Revises: d6bfb5d463e1
+Create Date: 2026-10-18 07:32:44.547136
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd03c6aa64f5b'
+down_revision = 'd6bfb5d463e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Versions of TABLE_VERSIONS_BACKEND=database, the rows are created on first use
+    op.create_table('table_version',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.String(length=32), nullable=False),
+    sa.Column('changed_at', sa.Double(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('table_version')
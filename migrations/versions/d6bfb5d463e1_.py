@@ -0,0 +1,45 @@
+"""filter and sort indexes
+
+Revision ID: d6bfb5d463e1
+Revises: c3b8d1f4e2a7
+Create Date: 2026-10-18 16:22:44.088911
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd6bfb5d463e1'
+down_revision = 'c3b8d1f4e2a7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # (column, id): equality filters and ?sort= pages are index range scans
+    with op.batch_alter_table('people', schema=None) as batch_op:
+        batch_op.create_index('ix_people_gender_id', ['gender', 'id'], unique=False)
+        batch_op.create_index('ix_people_height_id', ['height', 'id'], unique=False)
+
+    with op.batch_alter_table('planet', schema=None) as batch_op:
+        batch_op.create_index('ix_planet_climate_id', ['climate', 'id'], unique=False)
+        batch_op.create_index('ix_planet_population_id', ['population', 'id'], unique=False)
+
+    with op.batch_alter_table('vehicle', schema=None) as batch_op:
+        batch_op.create_index('ix_vehicle_capacity_id', ['capacity', 'id'], unique=False)
+        batch_op.create_index('ix_vehicle_model_id', ['model', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('vehicle', schema=None) as batch_op:
+        batch_op.drop_index('ix_vehicle_model_id')
+        batch_op.drop_index('ix_vehicle_capacity_id')
+
+    with op.batch_alter_table('planet', schema=None) as batch_op:
+        batch_op.drop_index('ix_planet_population_id')
+        batch_op.drop_index('ix_planet_climate_id')
+
+    with op.batch_alter_table('people', schema=None) as batch_op:
+        batch_op.drop_index('ix_people_height_id')
+        batch_op.drop_index('ix_people_gender_id')
@@ -1,41 +1,97 @@
 import os
+from flask import g
 from flask_admin import Admin
 from models import db, User, Planet, People, Vehicle, Favorite
+from favorites import favorite_target, move_counters
 from flask_admin.contrib.sqla import ModelView
-from markupsafe import Markup
+from sqlalchemy import func, select
+
+ADMIN_PAGE_SIZE = 20
+
+
+def favorite_count_formatter(view, context, model, name):
+    # Los conteos de la página se calculan con una sola consulta en get_list
+    return g.get("admin_favorite_counts", {}).get(model.id, 0)
+
+
+class FavoriteCountView(ModelView):
+    """List view that shows how many favorites each row has instead of loading them.
+
+    favorite_column names the Favorite column pointing to the model, the counts of the
+    whole page come from one grouped query."""
+    favorite_column = None
+    page_size = ADMIN_PAGE_SIZE
+
+    def get_list(self, page, sort_column, sort_desc, search, filters, execute=True, page_size=None):
+        count, items = super().get_list(page, sort_column, sort_desc, search, filters, execute, page_size)
+        if execute and items:
+            column = getattr(Favorite, self.favorite_column)
+            g.admin_favorite_counts = dict(self.session.execute(
+                select(column, func.count())
+                .where(column.in_([item.id for item in items]))
+                .group_by(column)
+            ).all())
+        return count, items
 
-def favorite_user_formatter(view, context, model, name):
-    favorites = getattr(model, name)
-    user_list = []
-    for fav in favorites:
-        user_name = fav.user_item.name if fav.user_item else "Usuario Desconocido"
-        user_list.append(user_name)
-    return Markup(", ".join(user_list))
 
 def setup_admin(app):
     app.secret_key = os.environ.get('FLASK_APP_KEY', 'sample key')
     app.config['FLASK_ADMIN_SWATCH'] = 'cerulean'
     admin = Admin(app, name='4Geeks Admin', template_mode='bootstrap3')
 
-    class User_admin(ModelView):
+    class User_admin(FavoriteCountView):
         column_list= ["id", "username", "name", "email", "password", "subscription_date", "upgrade", "favorites_item"]
+        column_labels = {'favorites_item': 'Favorites'}
+        column_formatters = {'favorites_item': favorite_count_formatter}
+        form_excluded_columns = ['favorites_item']
+        favorite_column = 'user_id'
 
-    class People_admin(ModelView):
+    class People_admin(FavoriteCountView):
         column_list= ["id", "full_name", "gender", "description", "height", "url", "favorite_people"]
-        column_formatters = {'favorite_people': favorite_user_formatter}
+        column_labels = {'favorite_people': 'Favorites'}
+        column_formatters = {'favorite_people': favorite_count_formatter}
+        form_excluded_columns = ['favorite_people']
+        favorite_column = 'people_id'
 
-    class Planets_admin(ModelView):
+    class Planets_admin(FavoriteCountView):
         column_list= ["id", "name", "climate", "description", "population", "url", "favorite_planets"]
-        column_formatters = {'favorite_planets': favorite_user_formatter}
+        column_labels = {'favorite_planets': 'Favorites'}
+        column_formatters = {'favorite_planets': favorite_count_formatter}
+        form_excluded_columns = ['favorite_planets']
+        favorite_column = 'planet_id'
 
-    class Vehicles_admin(ModelView):
+    class Vehicles_admin(FavoriteCountView):
         column_list= ["id", "name", "model", "description", "capacity", "url", "favorite_vehicles"]
-        column_formatters = {'favorite_vehicles': favorite_user_formatter}
+        column_labels = {'favorite_vehicles': 'Favorites'}
+        column_formatters = {'favorite_vehicles': favorite_count_formatter}
+        form_excluded_columns = ['favorite_vehicles']
+        favorite_column = 'vehicle_id'
 
     class Favorite_admin(ModelView):
         column_list= ["id", "user_id", "planet_id", "people_id", "vehicle_id", "user_item", "planet_item", "people_item", "vehicle_item"]
+        # Los cuatro objetos relacionados llegan en la misma consulta de la página
+        column_select_related_list = [Favorite.user_item, Favorite.planet_item, Favorite.people_item, Favorite.vehicle_item]
+        page_size = ADMIN_PAGE_SIZE
+        # Los selects del formulario buscan por AJAX en vez de cargar todas las filas
+        form_ajax_refs = {
+            'user_item': {'fields': ['username', 'name', 'email'], 'page_size': 10},
+            'planet_item': {'fields': ['name'], 'page_size': 10},
+            'people_item': {'fields': ['full_name'], 'page_size': 10},
+            'vehicle_item': {'fields': ['name'], 'page_size': 10},
+        }
+
+        # Los contadores de /popular cambian en la misma transacción que el favorito
+        def on_model_change(self, form, model, is_created):
+            # Las columnas aún tienen el destino anterior, el formulario solo cambió las relaciones
+            before = None if is_created else favorite_target(model)
+            self.session.add(model)
+            self.session.flush()
+            move_counters(before, favorite_target(model))
+
+        def on_model_delete(self, model):
+            move_counters(favorite_target(model), None)
+
 
-    
     # Add your models here, for example this is how we add a the User model to the admin
     admin.add_view(User_admin(User, db.session))
     admin.add_view(People_admin(People, db.session))
@@ -44,4 +100,4 @@ def setup_admin(app):
     admin.add_view(Favorite_admin(Favorite, db.session))
 
     # You can duplicate that line to add mew models
-    # admin.add_view(ModelView(YourModelName, db.session))
\ No newline at end of file
+    # admin.add_view(ModelView(YourModelName, db.session))
@@ -2,18 +2,34 @@
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
 """
 import os
-from flask import Flask, request, jsonify, url_for
-from flask_migrate import Migrate
-from flask_swagger import swagger
+from flask import Flask, Response, request, jsonify, url_for
 from flask_cors import CORS
-from utils import APIException, generate_sitemap
-from admin import setup_admin
+from utils import APIException, paginate, get_fields, get_page_size, is_filtered
+from startup import init_admin, LazyMigrate, startup_profile_command
+from bulk import bulk_import
+from export import stream_export
+from versions import table_versions, conditional
+from health import sitemap, readiness_check
+from cache import entity_cache
+from snapshot import catalog_snapshot
+from serializers import json_provider_class, row_serializer
+from favorites import conflict_insert, parse_batch, add_favorites, remove_favorites, change_counters
+from favorites import top_favorites, rebuild_counters_command, POPULAR_TARGETS, DEFAULT_POPULAR_LIMIT, MAX_POPULAR_LIMIT
+from pool import engine_options, pool_stats
+from replicas import replica_router, read_only
+from metrics import request_metrics
+from slowlog import slow_query_log
+from seed import seed_command
+from search import search, SEARCH_TARGETS, DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT
 from models import db, User, People, Planet, Vehicle, Favorite, GenderEnum
-from sqlalchemy import select
+from sqlalchemy import select, insert, delete, exists, literal, Integer
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 # from models import Person
 
 app = Flask(__name__)
 app.url_map.strict_slashes = False
+app.json = json_provider_class()(app)
 
 db_url = os.getenv("DATABASE_URL")
 if db_url is not None:
@@ -22,11 +38,25 @@ if db_url is not None:
 else:
     app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+
+replica_router.init_app(app)
 
-MIGRATE = Migrate(app, db)
 db.init_app(app)
+table_versions.init_app(app, db.session)
+entity_cache.init_app(app)
+catalog_snapshot.init_app(app)
+request_metrics.init_app(app)
+slow_query_log.init_app(app)
+readiness_check.init_app(app)
 CORS(app)
-setup_admin(app)
+# Flask-Admin se monta en la primera petición a /admin salvo con ENABLE_ADMIN=1 o 0
+init_admin(app)
+# Flask-Migrate y Alembic solo se importan al usar `flask db`
+app.cli.add_command(LazyMigrate(app, db))
+app.cli.add_command(startup_profile_command)
+app.cli.add_command(seed_command)
+app.cli.add_command(rebuild_counters_command)
 
 # Handle/serialize errors like a JSON object
 
@@ -35,28 +65,72 @@ setup_admin(app)
 def handle_invalid_usage(error):
     return jsonify(error.to_dict()), error.status_code
 
-# generate sitemap with all your endpoints
+# generate sitemap with all your endpoints (?format=json lista todas las rutas)
 
 
 @app.route('/')
-def sitemap():
-    return generate_sitemap(app)
+def get_sitemap():
+    return sitemap.response(app)
+
+
+# Sondas: el proceso responde / la base de datos responde (resultado cacheado)
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    return jsonify({"status": "ok"}), 200
+
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    body, status = readiness_check.response()
+    return jsonify(body), status
+
+
+# Estadísticas internas de la caché de entidades (por proceso)
+@app.route('/_internal/cache', methods=['GET'])
+def cache_stats():
+    return jsonify(entity_cache.stats()), 200
+
+
+# Copia en memoria de los catálogos (por proceso)
+@app.route('/_internal/snapshot', methods=['GET'])
+def snapshot_stats():
+    return jsonify(catalog_snapshot.stats()), 200
+
+
+# Estado del pool de conexiones de este worker
+@app.route('/_internal/pool', methods=['GET'])
+def pool_status():
+    return jsonify({"pid": os.getpid(), "pool": pool_stats(db.engine), "replicas": replica_router.stats()}), 200
+
+
+# Métricas de peticiones y SQL en formato Prometheus (por worker)
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(request_metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 # Endpoints de  usuarios
 @app.route('/users', methods=['GET'])
+@conditional("user")
+@read_only
 def get_all_users():
-    users = db.session.execute(select(User)).scalars().all()
-    users = list(map(lambda item: item.serialize(), users))
-    return jsonify(users), 200
+    serializer = row_serializer(User, get_fields(User))
+    # Exportación completa en streaming: ?format=ndjson o ?format=json
+    if "format" in request.args:
+        return stream_export(serializer.select(), User, request.args["format"], serializer)
+    users, next_url = paginate(serializer.select(), User)
+    users = serializer.many(users)
+    return jsonify({"results": users, "next": next_url}), 200
 
 
 @app.route("/user/<int:theid>", methods=['GET'])
+@conditional("user")
+@read_only
 def get_one_user(theid):
-    user = db.session.get(User, theid)
+    user = entity_cache.response(User, theid, get_fields(User))
     if user is None:
         return jsonify({"message": f"User ID {theid} not found, please verify"}), 404
-    return jsonify(user.serialize()), 200
+    return user, 200
 
 
 @app.route("/user", methods=["POST"])
@@ -101,18 +175,34 @@ def delete_user(theid):
 
 # Endpoints de personajes
 @app.route('/people', methods=['GET'])
+@conditional("people")
+@read_only
 def get_all_peoples():
-    peoples = db.session.execute(select(People)).scalars().all()
-    peoples = list(map(lambda item: item.serialize(), peoples))
-    return jsonify(peoples), 200
+    serializer = row_serializer(People, get_fields(People))
+    # Exportación completa en streaming: ?format=ndjson o ?format=json
+    if "format" in request.args:
+        return stream_export(serializer.select(), People, request.args["format"], serializer)
+    # Con CATALOG_SNAPSHOT la página sale de la copia en memoria, sin SQL (salvo con filtros u orden)
+    snapshot = catalog_snapshot.current(People)
+    if snapshot is not None and not is_filtered(People):
+        return snapshot.page_response(get_fields(People)), 200
+    peoples, next_url = paginate(serializer.select(), People)
+    peoples = serializer.many(peoples)
+    return jsonify({"results": peoples, "next": next_url}), 200
 
 
 @app.route("/people/<int:theid>", methods=['GET'])
+@conditional("people")
+@read_only
 def get_one_people(theid):
-    people = db.session.get(People, theid)
+    snapshot = catalog_snapshot.current(People)
+    if snapshot is not None:
+        people = snapshot.response(theid, get_fields(People))
+    else:
+        people = entity_cache.response(People, theid, get_fields(People))
     if people is None:
         return jsonify({"message": f"People ID {theid} not found, please verify"}), 404
-    return jsonify(people.serialize()), 200
+    return people, 200
 
 
 @app.route("/people", methods=["POST"])
@@ -137,6 +227,13 @@ def add_new_people():
         return jsonify({"message": "Internal Server Error: Could not save user"}), 500
 
 
+# Carga masiva: una fila JSON por línea (NDJSON)
+@app.route("/people/bulk", methods=["POST"])
+def bulk_add_people():
+    summary = bulk_import(People, "full_name", required=["full_name", "gender", "description", "url"])
+    return jsonify(summary), 200
+
+
 @app.route("/people/<int:theid>", methods=["DELETE"])
 def delete_people(theid):
     people = db.session.get(People, theid)
@@ -153,18 +250,34 @@ def delete_people(theid):
 
 # Endpoints de planetas
 @app.route('/planets', methods=['GET'])
+@conditional("planet")
+@read_only
 def get_all_planets():
-    planets = db.session.execute(select(Planet)).scalars().all()
-    planets = list(map(lambda item: item.serialize(), planets))
-    return jsonify(planets), 200
+    serializer = row_serializer(Planet, get_fields(Planet))
+    # Exportación completa en streaming: ?format=ndjson o ?format=json
+    if "format" in request.args:
+        return stream_export(serializer.select(), Planet, request.args["format"], serializer)
+    # Con CATALOG_SNAPSHOT la página sale de la copia en memoria, sin SQL (salvo con filtros u orden)
+    snapshot = catalog_snapshot.current(Planet)
+    if snapshot is not None and not is_filtered(Planet):
+        return snapshot.page_response(get_fields(Planet)), 200
+    planets, next_url = paginate(serializer.select(), Planet)
+    planets = serializer.many(planets)
+    return jsonify({"results": planets, "next": next_url}), 200
 
 
 @app.route("/planets/<int:theid>", methods=['GET'])
+@conditional("planet")
+@read_only
 def get_one_planet(theid):
-    planet = db.session.get(Planet, theid)
+    snapshot = catalog_snapshot.current(Planet)
+    if snapshot is not None:
+        planet = snapshot.response(theid, get_fields(Planet))
+    else:
+        planet = entity_cache.response(Planet, theid, get_fields(Planet))
     if planet is None:
         return jsonify({"message": f"Planet ID {theid} not found, please verify"}), 404
-    return jsonify(planet.serialize()), 200
+    return planet, 200
 
 
 @app.route("/planets", methods=["POST"])
@@ -191,6 +304,13 @@ def add_new_planet():
         return jsonify({"message": "Internal Server Error: Could not save user"}), 500
 
 
+# Carga masiva: una fila JSON por línea (NDJSON)
+@app.route("/planets/bulk", methods=["POST"])
+def bulk_add_planets():
+    summary = bulk_import(Planet, "name", required=["name", "description", "url"])
+    return jsonify(summary), 200
+
+
 @app.route("/planets/<int:theid>", methods=["DELETE"])
 def delete_planet(theid):
     planet = db.session.get(Planet, theid)
@@ -207,18 +327,34 @@ def delete_planet(theid):
 
 # Endpoints de Vehículos
 @app.route('/vehicles', methods=['GET'])
+@conditional("vehicle")
+@read_only
 def get_all_vehicles():
-    vehicles = db.session.execute(select(Vehicle)).scalars().all()
-    vehicles = list(map(lambda item: item.serialize(), vehicles))
-    return jsonify(vehicles), 200
+    serializer = row_serializer(Vehicle, get_fields(Vehicle))
+    # Exportación completa en streaming: ?format=ndjson o ?format=json
+    if "format" in request.args:
+        return stream_export(serializer.select(), Vehicle, request.args["format"], serializer)
+    # Con CATALOG_SNAPSHOT la página sale de la copia en memoria, sin SQL (salvo con filtros u orden)
+    snapshot = catalog_snapshot.current(Vehicle)
+    if snapshot is not None and not is_filtered(Vehicle):
+        return snapshot.page_response(get_fields(Vehicle)), 200
+    vehicles, next_url = paginate(serializer.select(), Vehicle)
+    vehicles = serializer.many(vehicles)
+    return jsonify({"results": vehicles, "next": next_url}), 200
 
 
 @app.route("/vehicles/<int:theid>", methods=['GET'])
+@conditional("vehicle")
+@read_only
 def get_one_vehicle(theid):
-    vehicle = db.session.get(Vehicle, theid)
+    snapshot = catalog_snapshot.current(Vehicle)
+    if snapshot is not None:
+        vehicle = snapshot.response(theid, get_fields(Vehicle))
+    else:
+        vehicle = entity_cache.response(Vehicle, theid, get_fields(Vehicle))
     if vehicle is None:
         return jsonify({"message": f"Vehicle ID {theid} not found, please verify"}), 404
-    return jsonify(vehicle.serialize()), 200
+    return vehicle, 200
 
 
 @app.route("/vehicles", methods=["POST"])
@@ -245,6 +381,13 @@ def add_new_vehicle():
         return jsonify({"message": "Internal Server Error: Could not save user"}), 500
 
 
+# Carga masiva: una fila JSON por línea (NDJSON)
+@app.route("/vehicles/bulk", methods=["POST"])
+def bulk_add_vehicles():
+    summary = bulk_import(Vehicle, "name", required=["name", "description", "url"])
+    return jsonify(summary), 200
+
+
 @app.route("/vehicles/<int:theid>", methods=["DELETE"])
 def delete_vehicle(theid):
     vehicle = db.session.get(Vehicle, theid)
@@ -259,37 +402,131 @@ def delete_vehicle(theid):
         return jsonify({"message": f"Error delete User: {err.args}"}), 500
 
 
+# Búsqueda en personajes, planetas y vehículos: /search?q=texto&type=people,planet&limit=20
+@app.route('/search', methods=['GET'])
+@conditional("people", "planet", "vehicle")
+@read_only
+def search_catalog():
+    kinds = request.args.get("type")
+    kinds = [kind.strip() for kind in kinds.split(",")] if kinds else list(SEARCH_TARGETS)
+    limit = get_page_size(DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT)
+    results = search(request.args.get("q", ""), kinds, limit)
+    return jsonify({"results": results}), 200
+
+
+# Los más añadidos a favoritos: /popular/people?limit=10 (también planets y vehicles)
+@app.route('/popular/<kind>', methods=['GET'])
+@conditional("favorite_counter", "people", "planet", "vehicle")
+@read_only
+def get_popular(kind):
+    if kind not in POPULAR_TARGETS:
+        return jsonify({"message": f"kind must be one of: {', '.join(POPULAR_TARGETS)}"}), 404
+    limit = get_page_size(DEFAULT_POPULAR_LIMIT, MAX_POPULAR_LIMIT)
+    return jsonify({"results": top_favorites(kind, limit)}), 200
+
+
 # Endpoints favoritos
 
+def insert_favorite(theid, target_column, target_model, target_id):
+    """Inserta el favorito con una sola sentencia que comprueba que existan el usuario y el
+    destino y que ignora el duplicado gracias a los índices únicos de Favorite.
+    Devuelve el id del favorito creado (True si el motor no lo informa) o None si no se
+    insertó nada."""
+    source = select(literal(theid, Integer), literal(target_id, Integer)).where(
+        exists().where(User.id == theid),
+        exists().where(target_model.id == target_id),
+    )
+    columns = ["user_id", target_column.key]
+    dialect_insert = conflict_insert()
+    if dialect_insert is not None:
+        stmt = (
+            dialect_insert(Favorite)
+            .from_select(columns, source)
+            .on_conflict_do_nothing(index_elements=columns)
+            .returning(Favorite.id)
+        )
+        return db.session.execute(stmt).scalar_one_or_none()
+
+    # Otros motores: el índice único sigue evitando el duplicado
+    try:
+        with db.session.begin_nested():
+            result = db.session.execute(insert(Favorite).from_select(columns, source))
+    except IntegrityError:
+        return None
+    # En un INSERT ... SELECT inserted_primary_key no trae el id, solo vale el rowcount
+    return True if result.rowcount else None
+
+
+def delete_favorite(theid, target_column, target_id):
+    """Borra el favorito con una sola sentencia. Devuelve True solo si esta petición lo borró,
+    así dos borrados simultáneos del mismo favorito no lo restan dos veces del contador."""
+    result = db.session.execute(
+        delete(Favorite).where(Favorite.user_id == theid, target_column == target_id),
+        execution_options={"synchronize_session": False},
+    )
+    return result.rowcount > 0
+
+
 @app.route("/users/<int:theid>/favorites", methods=['GET'])
+@conditional("user", "favorite", "people", "planet", "vehicle")
+@read_only
 def get_user_favorites(theid):
     user = db.session.get(User, theid)
     if user is None:
         return jsonify({"message": f"User ID {theid} not found."}), 404
-    favorites = user.favorites_item
+    # Una sola consulta por tabla destino (selectin), sin importar cuántos favoritos tenga el usuario
+    favorites = db.session.execute(
+        select(Favorite)
+        .where(Favorite.user_id == theid)
+        .order_by(Favorite.id)
+        .options(
+            selectinload(Favorite.people_item),
+            selectinload(Favorite.planet_item),
+            selectinload(Favorite.vehicle_item),
+        )
+    ).scalars().all()
     favorites_list = [item.serialize() for item in favorites]
     return jsonify(favorites_list), 200
 
 
 
-# Agregar personaje a favoritos de user con id x
-@app.route("/users/<int:theid>/favorite/people/<int:people_id>", methods=["POST"])
-def add_favorite_people(theid, people_id):
-    user = db.session.get(User, theid)
-    if user is None:
+# Añadir o eliminar varios favoritos en una sola petición: {"items": [{"type": "people", "id": 1}, ...]}
+@app.route("/users/<int:theid>/favorites:batch", methods=["POST", "DELETE"])
+def batch_favorites(theid):
+    body = request.get_json(silent=True)
+    if body is None:
+        return jsonify({"message": "You need tu specify the request body as a json object"}), 400
+    results = parse_batch(body)
+    if db.session.get(User, theid) is None:
         return jsonify({"message": f"User with id {theid} not found."}), 404
-    people = db.session.get(People, people_id)
-    if people is None:
-        return jsonify({"message": f"People with id {people_id} not found."}), 404
+    try:
+        if request.method == "POST":
+            add_favorites(theid, results)
+        else:
+            remove_favorites(theid, results)
+        db.session.commit()
+        return jsonify({"results": results}), 200
+    except APIException:
+        db.session.rollback()
+        raise
+    except Exception as err:
+        db.session.rollback()
+        return jsonify({"message": f"Error updating favorites: {err.args}"}), 500
 
-    existe_favorito = db.session.execute(select(Favorite).where(Favorite.user_id == theid, Favorite.people_id == people_id)).scalar_one_or_none()
-    if existe_favorito:
-        return jsonify({"message": "The people is already in the favorites."}), 409
 
-    new_favorite = Favorite(user_id=theid, people_id=people_id)
-    db.session.add(new_favorite)
-    
+# Agregar personaje a favoritos de user con id x
+@app.route("/users/<int:theid>/favorite/people/<int:people_id>", methods=["POST"])
+def add_favorite_people(theid, people_id):
     try:
+        favorite_id = insert_favorite(theid, Favorite.people_id, People, people_id)
+        if favorite_id is None:
+            # Solo se consulta el motivo cuando la inserción no se hizo
+            if db.session.get(User, theid) is None:
+                return jsonify({"message": f"User with id {theid} not found."}), 404
+            if db.session.get(People, people_id) is None:
+                return jsonify({"message": f"People with id {people_id} not found."}), 404
+            return jsonify({"message": "The people is already in the favorites."}), 409
+        change_counters("people", {people_id: 1})
         db.session.commit()
         return jsonify({"message": "Person added to favorites successfully"}), 201
     except Exception as err:
@@ -301,11 +538,10 @@ def add_favorite_people(theid, people_id):
 # Eliminar un personaje de favoritos
 @app.route("/users/<int:theid>/favorite/people/<int:people_id>", methods=["DELETE"])
 def delete_favorite_people(theid, people_id):
-    favorite_delete = db.session.execute(select(Favorite).where(Favorite.user_id == theid, Favorite.people_id == people_id)).scalar_one_or_none()
-    if favorite_delete is None:
-        return jsonify({"message": "Favorite people not found for this user."}), 404
-    db.session.delete(favorite_delete)
     try:
+        if not delete_favorite(theid, Favorite.people_id, people_id):
+            return jsonify({"message": "Favorite people not found for this user."}), 404
+        change_counters("people", {people_id: -1})
         db.session.commit()
         return jsonify({"message": "Favorite people deleted successfully."}), 200
     except Exception as err:
@@ -317,21 +553,16 @@ def delete_favorite_people(theid, people_id):
 # Añadir un planeta a favoritos
 @app.route("/users/<int:theid>/favorite/planet/<int:planet_id>", methods=["POST"])
 def add_favorite_planet(theid, planet_id):
-    user = db.session.get(User, theid)
-    if user is None:
-        return jsonify({"message": f"User with id {theid} not found."}), 404
-    planet = db.session.get(Planet, planet_id)
-    if planet is None:
-        return jsonify({"message": f"Planet with id {planet_id} not found."}), 404
-
-    existing_favorite = db.session.execute(select(Favorite).where(Favorite.user_id == theid, Favorite.planet_id == planet_id)).scalar_one_or_none()
-    if existing_favorite:
-        return jsonify({"message": "The planet is already in the favorites."}), 409
-
-    new_favorite = Favorite(user_id=theid, planet_id=planet_id)
-    db.session.add(new_favorite)
-    
     try:
+        favorite_id = insert_favorite(theid, Favorite.planet_id, Planet, planet_id)
+        if favorite_id is None:
+            # Solo se consulta el motivo cuando la inserción no se hizo
+            if db.session.get(User, theid) is None:
+                return jsonify({"message": f"User with id {theid} not found."}), 404
+            if db.session.get(Planet, planet_id) is None:
+                return jsonify({"message": f"Planet with id {planet_id} not found."}), 404
+            return jsonify({"message": "The planet is already in the favorites."}), 409
+        change_counters("planet", {planet_id: 1})
         db.session.commit()
         return jsonify({"message": "Planet added to favorites successfully"}), 201
     except Exception as err:
@@ -342,11 +573,10 @@ def add_favorite_planet(theid, planet_id):
 # Eliminar un planeta de favoritos
 @app.route("/users/<int:theid>/favorite/planet/<int:planet_id>", methods=["DELETE"])
 def delete_favorite_planet(theid, planet_id):
-    favorite_delete = db.session.execute(select(Favorite).where(Favorite.user_id == theid, Favorite.planet_id == planet_id)).scalar_one_or_none()
-    if favorite_delete is None:
-        return jsonify({"message": "Favorite planet not found for this user."}), 404
-    db.session.delete(favorite_delete)
     try:
+        if not delete_favorite(theid, Favorite.planet_id, planet_id):
+            return jsonify({"message": "Favorite planet not found for this user."}), 404
+        change_counters("planet", {planet_id: -1})
         db.session.commit()
         return jsonify({"message": "Favorite planet deleted successfully."}), 200
     except Exception as err:
@@ -358,21 +588,16 @@ def delete_favorite_planet(theid, planet_id):
 # Añadir un vehículo a favoritos
 @app.route("/users/<int:theid>/favorite/vehicle/<int:vehicle_id>", methods=["POST"])
 def add_favorite_vehicle(theid, vehicle_id):
-    user = db.session.get(User, theid)
-    if user is None:
-        return jsonify({"message": f"User with id {theid} not found."}), 404
-    vehicle = db.session.get(Vehicle, vehicle_id)
-    if vehicle is None:
-        return jsonify({"message": f"Vehicle with id {vehicle_id} not found."}), 404
-
-    existing_favorite = db.session.execute(select(Favorite).where(Favorite.user_id == theid, Favorite.vehicle_id == vehicle_id)).scalar_one_or_none()
-    if existing_favorite:
-        return jsonify({"message": "The vehicle is already in the favorites."}), 409
-
-    new_favorite = Favorite(user_id=theid, vehicle_id=vehicle_id)
-    db.session.add(new_favorite)
-    
     try:
+        favorite_id = insert_favorite(theid, Favorite.vehicle_id, Vehicle, vehicle_id)
+        if favorite_id is None:
+            # Solo se consulta el motivo cuando la inserción no se hizo
+            if db.session.get(User, theid) is None:
+                return jsonify({"message": f"User with id {theid} not found."}), 404
+            if db.session.get(Vehicle, vehicle_id) is None:
+                return jsonify({"message": f"Vehicle with id {vehicle_id} not found."}), 404
+            return jsonify({"message": "The vehicle is already in the favorites."}), 409
+        change_counters("vehicle", {vehicle_id: 1})
         db.session.commit()
         return jsonify({"message": "Vehicle added to favorites successfully"}), 201
     except Exception as err:
@@ -383,11 +608,10 @@ def add_favorite_vehicle(theid, vehicle_id):
 # Eliminar un vehículo de favoritos
 @app.route("/users/<int:theid>/favorite/vehicle/<int:vehicle_id>", methods=["DELETE"])
 def delete_favorite_vehicle(theid, vehicle_id):
-    favorite_delete = db.session.execute(select(Favorite).where(Favorite.user_id == theid, Favorite.vehicle_id == vehicle_id)).scalar_one_or_none()
-    if favorite_delete is None:
-        return jsonify({"message": "Favorite vehicle not found for this user."}), 404
-    db.session.delete(favorite_delete)
     try:
+        if not delete_favorite(theid, Favorite.vehicle_id, vehicle_id):
+            return jsonify({"message": "Favorite vehicle not found for this user."}), 404
+        change_counters("vehicle", {vehicle_id: -1})
         db.session.commit()
         return jsonify({"message": "Favorite vehicle deleted successfully."}), 200
     except Exception as err:
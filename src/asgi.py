@@ -0,0 +1,354 @@
+"""
+ASGI entry point, an alternative to wsgi.py for serving with an event loop:
+
+    uvicorn asgi:app --app-dir src --workers 4
+
+The hot read endpoints (lists, details and a user's favorites) run natively on
+SQLAlchemy's async engine (asyncpg for PostgreSQL, aiosqlite for SQLite), so a slow
+query only parks a coroutine instead of blocking a whole worker. Every other route,
+and the list exports (?format=), is handed to the Flask app in a thread pool, so the
+routes and JSON contracts are exactly the ones of wsgi.py.
+
+Needs uvicorn[standard] plus asyncpg (PostgreSQL) or aiosqlite (SQLite). Read replicas
+and the entity cache are only used by the Flask routes. The native routes are counted
+in /metrics and the slow request log like the Flask ones; the plans of their slow
+statements are taken on the Flask engine, so on PostgreSQL (asyncpg and psycopg2
+write parameters differently) the log has the statements without their plan. With CATALOG_SNAPSHOT=1 the
+catalog lists and details go to the Flask routes too, which answer from memory.
+"""
+import asyncio
+import concurrent.futures
+import io
+import sys
+import threading
+from urllib.parse import parse_qsl, urlencode
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import selectinload
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import parse_etags
+from werkzeug.routing import Map, Rule
+from app import app as flask_app
+from metrics import request_metrics, start_native_request
+from models import db, User, People, Planet, Vehicle, Favorite
+from slowlog import slow_query_log
+from serializers import row_serializer
+from snapshot import catalog_snapshot
+from utils import APIException, QUERY_SAFE, get_fields, page_query, next_page_args
+from versions import table_versions
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+# Queue size between the Flask thread and the event loop for delegated responses
+WSGI_BUFFERED_CHUNKS = 8
+# How often a Flask thread waiting for room in that queue checks whether the client left
+WSGI_PUT_POLL_SECONDS = 0.5
+
+
+def async_database_url(url):
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise RuntimeError(f"There is no async driver configured for {url.get_backend_name()}")
+    return url.set(drivername=driver)
+
+
+class AsyncDatabase:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.engine = None
+
+    def get_engine(self):
+        if self.engine is None:
+            config = self.flask_app.config
+            options = {
+                key: value for key, value in config.get("SQLALCHEMY_ENGINE_OPTIONS", {}).items()
+                if key != "poolclass"
+            }
+            self.engine = create_async_engine(async_database_url(config["SQLALCHEMY_DATABASE_URI"]), **options)
+        return self.engine
+
+    async def dispose(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+            self.engine = None
+
+
+database = AsyncDatabase(flask_app)
+
+
+def json_response(status, payload, headers=()):
+    return status, flask_app.json.dumps_bytes(payload), [("content-type", "application/json"), *headers]
+
+
+async def list_items(request, model):
+    serializer = row_serializer(model, get_fields(model, request["args"]))
+    stmt, limit = page_query(serializer.select(), model, request["args"])
+    async with database.get_engine().connect() as connection:
+        rows = (await connection.execute(stmt)).all()
+    args = next_page_args(rows, limit, request["args"])
+    next_url = f"{request['root_path']}{request['path']}?{urlencode(args, safe=QUERY_SAFE)}" if args is not None else None
+    return json_response(200, {"results": serializer.many(rows), "next": next_url})
+
+
+async def get_item(request, model, label, theid):
+    serializer = row_serializer(model, get_fields(model, request["args"]))
+    async with database.get_engine().connect() as connection:
+        row = (await connection.execute(serializer.select().where(model.id == theid))).first()
+    if row is None:
+        return json_response(404, {"message": f"{label} ID {theid} not found, please verify"})
+    return json_response(200, serializer(row))
+
+
+async def get_user_favorites(request, theid):
+    async with AsyncSession(database.get_engine(), expire_on_commit=False) as session:
+        if await session.get(User, theid) is None:
+            return json_response(404, {"message": f"User ID {theid} not found."})
+        favorites = (await session.execute(
+            select(Favorite)
+            .where(Favorite.user_id == theid)
+            .order_by(Favorite.id)
+            .options(
+                selectinload(Favorite.people_item),
+                selectinload(Favorite.planet_item),
+                selectinload(Favorite.vehicle_item),
+            )
+        )).scalars().all()
+        return json_response(200, [item.serialize() for item in favorites])
+
+
+# path -> (handler, extra arguments, tables the response is built from)
+url_map = Map([
+    Rule("/users", endpoint=(list_items, (User,), ("user",))),
+    Rule("/user/<int:theid>", endpoint=(get_item, (User, "User"), ("user",))),
+    Rule("/people", endpoint=(list_items, (People,), ("people",))),
+    Rule("/people/<int:theid>", endpoint=(get_item, (People, "People"), ("people",))),
+    Rule("/planets", endpoint=(list_items, (Planet,), ("planet",))),
+    Rule("/planets/<int:theid>", endpoint=(get_item, (Planet, "Planet"), ("planet",))),
+    Rule("/vehicles", endpoint=(list_items, (Vehicle,), ("vehicle",))),
+    Rule("/vehicles/<int:theid>", endpoint=(get_item, (Vehicle, "Vehicle"), ("vehicle",))),
+    Rule("/users/<int:theid>/favorites", endpoint=(
+        get_user_favorites, (), ("user", "favorite", "people", "planet", "vehicle")
+    )),
+], strict_slashes=False)
+
+
+def match_native(scope, args):
+    if scope["method"] != "GET" or "format" in args:
+        return None
+    try:
+        rule, view_args = url_map.bind("localhost").match(scope["path"], method="GET", return_rule=True)
+    except HTTPException:
+        return None
+    if flask_app.config["CATALOG_SNAPSHOT"] and set(rule.endpoint[2]) <= set(catalog_snapshot.models):
+        # Served from the in-memory snapshot by the Flask route, without SQL
+        return None
+    return rule, view_args
+
+
+def current_etag(tables):
+    # File reads, or a query with TABLE_VERSIONS_BACKEND=database: off the event loop
+    with flask_app.app_context():
+        return table_versions.etag(tables)
+
+
+def write_slow_request(record, statements):
+    # The plans are taken with the Flask engine, the async one can not run outside the loop
+    with flask_app.app_context():
+        slow_query_log.write(record, [(db.engine, *statement[1:]) for statement in statements])
+
+
+async def call_native(scope, send, rule, view_args, args):
+    handler, extra, tables = rule.endpoint
+    stats = start_native_request(record_statements=slow_query_log.enabled)
+    headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+    etag = await asyncio.to_thread(current_etag, tables)
+    cache_headers = [("etag", f'"{etag}"'), ("cache-control", flask_app.config["CACHE_CONTROL"])]
+    if etag in parse_etags(headers.get("if-none-match")):
+        status, body, response_headers = 304, b"", cache_headers
+    else:
+        request = {"args": args, "path": scope["path"], "root_path": scope.get("root_path", "")}
+        try:
+            status, body, response_headers = await handler(request, *extra, **view_args)
+        except APIException as error:
+            status, body, response_headers = json_response(error.status_code, error.to_dict())
+        if status == 200:
+            response_headers = [*response_headers, *cache_headers]
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(name.encode("latin-1"), value.encode("latin-1")) for name, value in response_headers]
+        + [(b"content-length", str(len(body)).encode("latin-1"))],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+    if request_metrics.enabled:
+        request_metrics.record(scope["method"], rule.rule, status, len(body), stats)
+    if slow_query_log.enabled:
+        query_string = scope["query_string"].decode("latin-1")
+        path = f"{scope['path']}?{query_string}" if query_string else scope["path"]
+        record = slow_query_log.record(scope["method"], rule.rule, path, status, stats)
+        if record is not None:
+            await asyncio.to_thread(write_slow_request, record, stats.statements)
+
+
+def build_environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name != "CONTENT_LENGTH":
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+async def call_wsgi(scope, receive, send):
+    body = bytearray()
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=WSGI_BUFFERED_CHUNKS)
+    disconnected = threading.Event()
+
+    def put(item):
+        # Waits for room in the queue, but gives up once the client is gone
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while True:
+            try:
+                return future.result(timeout=WSGI_PUT_POLL_SECONDS)
+            except concurrent.futures.TimeoutError:
+                if disconnected.is_set():
+                    future.cancel()
+                    raise ClientDisconnected()
+
+    def run():
+        # Runs in a worker thread, chunks are handed to the event loop one by one
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = headers
+
+        try:
+            iterable = flask_app(build_environ(scope, bytes(body)), start_response)
+            try:
+                put(("start", started["status"], started["headers"]))
+                for chunk in iterable:
+                    if disconnected.is_set():
+                        raise ClientDisconnected()
+                    if chunk:
+                        put(("body", chunk))
+            finally:
+                # Closing it ends a streamed export and releases its connection
+                if hasattr(iterable, "close"):
+                    iterable.close()
+            put(("end",))
+        except ClientDisconnected:
+            pass
+        except BaseException as error:
+            if not disconnected.is_set():
+                put(("error", error))
+
+    async def watch_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        disconnected.set()
+        try:
+            # Wakes the loop below when it is waiting for the next chunk
+            queue.put_nowait(("disconnect",))
+        except asyncio.QueueFull:
+            pass
+
+    future = loop.run_in_executor(None, run)
+    watcher = asyncio.ensure_future(watch_disconnect())
+    started = False
+    try:
+        while True:
+            item = await queue.get()
+            if disconnected.is_set():
+                break
+            if item[0] == "start":
+                started = True
+                await send({
+                    "type": "http.response.start",
+                    "status": item[1],
+                    "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in item[2]],
+                })
+            elif item[0] == "body":
+                await send({"type": "http.response.body", "body": item[1], "more_body": True})
+            elif item[0] == "end":
+                await send({"type": "http.response.body", "body": b""})
+                break
+            else:
+                if not started:
+                    await send({"type": "http.response.start", "status": 500, "headers": []})
+                await send({"type": "http.response.body", "body": b""})
+                await future
+                raise item[1]
+    finally:
+        # Also when send fails: the thread stops at its next chunk instead of waiting forever
+        disconnected.set()
+        watcher.cancel()
+        await future
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await asyncio.get_running_loop().run_in_executor(None, catalog_snapshot.load, flask_app)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await database.dispose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        raise RuntimeError(f"Unsupported ASGI scope {scope['type']}")
+    args = {}
+    for name, value in parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True):
+        # The first of repeated keys wins, as with request.args.get
+        args.setdefault(name, value)
+    native = match_native(scope, args)
+    if native is None:
+        return await call_wsgi(scope, receive, send)
+    return await call_native(scope, send, *native, args)
@@ -0,0 +1,167 @@
+"""
+Bulk NDJSON import for the catalog tables (People, Planet and Vehicle).
+
+The request body is read line by line, every line is validated against the model
+columns and the valid rows are inserted in chunks with a single executemany per
+chunk. Invalid rows and duplicates are reported in the summary instead of aborting
+the whole load.
+"""
+import io
+import json
+import math
+from flask import request
+from sqlalchemy import BigInteger, Enum, Float, Integer, SmallInteger, String, insert, select
+from sqlalchemy.exc import DataError, IntegrityError
+from models import db
+
+CHUNK_SIZE = 1000
+READ_BUFFER_SIZE = 64 * 1024
+# Only the first rows of each kind are echoed back, the counters are always exact
+MAX_REPORTED_ROWS = 100
+# Signed ranges of the integer column types, checked before the database sees them
+INTEGER_BITS = ((BigInteger, 64), (SmallInteger, 16), (Integer, 32))
+
+
+class RowError(ValueError):
+    pass
+
+
+def _integer_range(column_type):
+    bits = next(bits for integer_type, bits in INTEGER_BITS if isinstance(column_type, integer_type))
+    return -2 ** (bits - 1), 2 ** (bits - 1) - 1
+
+
+def _column_value(column, value):
+    column_type = column.type
+    if isinstance(column_type, Enum) and column_type.enum_class is not None:
+        for member in column_type.enum_class:
+            if isinstance(value, str) and value.lower() in (member.name.lower(), member.value.lower()):
+                return member
+        allowed = ", ".join(member.value for member in column_type.enum_class)
+        raise RowError(f"{column.name} must be one of: {allowed}")
+    if isinstance(column_type, String):
+        if not isinstance(value, str) or not value.strip():
+            raise RowError(f"{column.name} must be a non empty string")
+        if column_type.length is not None and len(value) > column_type.length:
+            raise RowError(f"{column.name} must be at most {column_type.length} characters")
+        return value
+    if isinstance(column_type, Integer):
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise RowError(f"{column.name} must be an integer")
+        low, high = _integer_range(column_type)
+        if not low <= value <= high:
+            raise RowError(f"{column.name} must be between {low} and {high}")
+        return value
+    if isinstance(column_type, Float):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise RowError(f"{column.name} must be a number")
+        try:
+            value = float(value)
+        except OverflowError:
+            raise RowError(f"{column.name} is out of range") from None
+        if not math.isfinite(value):
+            # 1e400 is parsed as inf, which neither the database nor JSON can hold
+            raise RowError(f"{column.name} is out of range")
+        return value
+    return value
+
+
+def parse_row(model, row, required):
+    if not isinstance(row, dict):
+        raise RowError("Each line must be a JSON object")
+    missing = [name for name in required if row.get(name) is None]
+    if missing:
+        raise RowError(f"You need specify: {', '.join(missing)}")
+
+    values = {}
+    for column in model.__table__.columns:
+        if column.primary_key:
+            continue
+        value = row.get(column.name)
+        if value is None:
+            # Every row carries the same keys so each chunk stays a single executemany
+            default = column.default
+            values[column.name] = default.arg if default is not None and default.is_scalar else None
+        else:
+            values[column.name] = _column_value(column, value)
+    return values
+
+
+def _report(summary, kind, item):
+    summary[kind] += 1
+    if len(summary[f"{kind}_rows"]) < MAX_REPORTED_ROWS:
+        summary[f"{kind}_rows"].append(item)
+
+
+def _flush(model, unique_key, chunk, summary):
+    column = getattr(model, unique_key)
+    keys = [values[unique_key] for _, values in chunk]
+    seen = set(db.session.execute(select(column).where(column.in_(keys))).scalars())
+
+    rows = []
+    for line, values in chunk:
+        key = values[unique_key]
+        if key in seen:
+            _report(summary, "duplicates", {"line": line, unique_key: key})
+            continue
+        seen.add(key)
+        rows.append((line, values))
+    if not rows:
+        return
+
+    try:
+        db.session.execute(insert(model.__table__), [values for _, values in rows])
+        db.session.commit()
+        summary["inserted"] += len(rows)
+    except (IntegrityError, DataError):
+        # Someone else inserted one of these rows meanwhile, or the database refused a value
+        # the checks above let through: retry the chunk row by row to find which
+        db.session.rollback()
+        for line, values in rows:
+            try:
+                db.session.execute(insert(model.__table__).values(**values))
+                db.session.commit()
+                summary["inserted"] += 1
+            except IntegrityError:
+                db.session.rollback()
+                _report(summary, "duplicates", {"line": line, unique_key: values[unique_key]})
+            except DataError as err:
+                db.session.rollback()
+                _report(summary, "errors", {"line": line, "message": str(err.orig)})
+
+
+def bulk_import(model, unique_key, required, chunk_size=CHUNK_SIZE):
+    summary = {
+        "received": 0,
+        "inserted": 0,
+        "duplicates": 0,
+        "errors": 0,
+        "duplicates_rows": [],
+        "errors_rows": [],
+    }
+    chunk = []
+    lines = request.stream
+    if isinstance(lines, io.RawIOBase):
+        # Werkzeug's raw stream reads lines byte by byte, buffer it
+        lines = io.BufferedReader(lines, buffer_size=READ_BUFFER_SIZE)
+    else:
+        # The server's own input (gunicorn's Body), already buffered but not an io stream
+        lines = iter(lines.readline, b"")
+    for line_number, raw_line in enumerate(lines, start=1):
+        line = raw_line.strip()
+        if not line:
+            continue
+        summary["received"] += 1
+        try:
+            values = parse_row(model, json.loads(line), required)
+        except ValueError as err:
+            # Covers RowError and malformed JSON lines
+            _report(summary, "errors", {"line": line_number, "message": str(err)})
+            continue
+        chunk.append((line_number, values))
+        if len(chunk) >= chunk_size:
+            _flush(model, unique_key, chunk, summary)
+            chunk = []
+    if chunk:
+        _flush(model, unique_key, chunk, summary)
+    return summary
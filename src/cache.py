@@ -0,0 +1,123 @@
+"""
+Bounded LRU/TTL cache of the serialized single-entity payloads (GET /people/<id>, ...).
+
+Entries are keyed by the table version from versions.py, so a create or delete made
+by any worker makes every cached payload of that table unreachable; the worker that
+committed the write also drops them right away.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from models import db
+from serializers import row_serializer
+from versions import table_versions, primary_after_write
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Local in-process backend. Any object with the same get/set/clear/stats methods
+    (a shared cache server client, for example) can be plugged in instead."""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return _MISSING
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return _MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class EntityCache:
+    def __init__(self, backend_factory=LRUCache):
+        self.backend_factory = backend_factory
+        self.backends = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault("ENTITY_CACHE_SIZE", int(os.getenv("ENTITY_CACHE_SIZE", 1024)))
+        app.config.setdefault("ENTITY_CACHE_TTL", int(os.getenv("ENTITY_CACHE_TTL", 300)))
+        table_versions.on_bump(self.invalidate)
+        app.extensions["entity_cache"] = self
+
+    def _backend(self, table):
+        backend = self.backends.get(table)
+        if backend is None:
+            with self._lock:
+                backend = self.backends.get(table)
+                if backend is None:
+                    backend = self.backend_factory(
+                        maxsize=current_app.config["ENTITY_CACHE_SIZE"],
+                        ttl=current_app.config["ENTITY_CACHE_TTL"],
+                    )
+                    self.backends[table] = backend
+        return backend
+
+    def invalidate(self, *tables):
+        for table in tables:
+            backend = self.backends.get(table)
+            if backend is not None:
+                backend.clear()
+
+    def response(self, model, theid, fields=None):
+        """JSON response with the serialized row, or None when the row does not exist."""
+        table = model.__table__.name
+        backend = self._backend(table)
+        key = (theid, fields, table_versions.get(table))
+        payload = backend.get(key)
+        if payload is _MISSING:
+            # The payload is kept under the current version, it must not come from a lagging replica
+            primary_after_write((table,))
+            serializer = row_serializer(model, fields)
+            row = db.session.execute(serializer.select().where(model.id == theid)).first()
+            if row is None:
+                return None
+            payload = current_app.json.dumps_bytes(serializer(row))
+            backend.set(key, payload)
+        return current_app.response_class(payload, mimetype="application/json")
+
+    def stats(self):
+        return {table: backend.stats() for table, backend in self.backends.items()}
+
+
+entity_cache = EntityCache()
@@ -0,0 +1,43 @@
+"""
+Streaming export of a whole table, used by the list endpoints with ?format=ndjson
+or ?format=json. Rows are fetched in batches through a server side cursor and
+written to the client as they are serialized, so memory stays bounded by the
+batch size and the first bytes leave right away.
+"""
+from flask import Response, current_app, stream_with_context
+from models import db
+from utils import APIException, get_filters, get_order
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+}
+
+
+def _generate(stmt, export_format, serializer):
+    dumps = current_app.json.dumps_bytes
+    result = db.session.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    if export_format == "ndjson":
+        for batch in result.partitions():
+            yield b"".join(dumps(serializer(row)) + b"\n" for row in batch)
+        return
+
+    yield b"["
+    separator = b""
+    for batch in result.partitions():
+        # The batch is encoded as one array, its brackets are dropped
+        yield separator + dumps(serializer.many(batch))[1:-1]
+        separator = b","
+    yield b"]"
+
+
+def stream_export(stmt, model, export_format, serializer):
+    if export_format not in EXPORT_FORMATS:
+        raise APIException(f"format must be one of: {', '.join(EXPORT_FORMATS)}", status_code=400)
+    # Same filters and order as the paginated list
+    stmt = stmt.where(*get_filters(model)).order_by(*get_order(model))
+    return Response(
+        stream_with_context(_generate(stmt, export_format, serializer)),
+        mimetype=EXPORT_FORMATS[export_format],
+    )
@@ -0,0 +1,239 @@
+"""
+Batch add/remove of a user's favorites, and the popularity counters.
+
+Every target type is validated with a single IN query and all the changes of a
+request are applied in one transaction, the result of each item is reported back.
+
+favorite_counter keeps how many users have each element in their favorites. The
+handlers that add or remove favorites change it in the same transaction, so the
+leaderboard (GET /popular/<kind>) is one index range scan instead of a GROUP BY over
+favorite. Removals count the rows each DELETE actually removed, so two requests deleting
+the same favorite take it off the counter once. The admin view of Favorite changes the
+counters too. `flask rebuild-counters` recomputes it from favorite, after editing
+favorite by hand for example.
+"""
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import delete, func, insert, literal, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from models import db, Favorite, FavoriteCounter, People, Planet, Vehicle
+from utils import APIException
+
+# type in the request body -> target model, Favorite column
+FAVORITE_TARGETS = {
+    "people": (People, "people_id"),
+    "planet": (Planet, "planet_id"),
+    "vehicle": (Vehicle, "vehicle_id"),
+}
+MAX_BATCH_ITEMS = 1000
+# /popular/<kind> -> counter kind, target model, column shown as the name
+POPULAR_TARGETS = {
+    "people": ("people", People, People.full_name),
+    "planets": ("planet", Planet, Planet.name),
+    "vehicles": ("vehicle", Vehicle, Vehicle.name),
+}
+DEFAULT_POPULAR_LIMIT = 10
+MAX_POPULAR_LIMIT = 100
+
+
+def conflict_insert():
+    """insert() of the current dialect when it supports ON CONFLICT DO NOTHING, None otherwise."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert
+    if dialect == "sqlite":
+        return sqlite.insert
+    return None
+
+
+def change_counters(kind, deltas):
+    """Adds each delta ({target id: +n/-n}) to the favorite counter of that target."""
+    rows = [{"kind": kind, "target_id": target_id, "total": delta} for target_id, delta in deltas.items() if delta]
+    if not rows:
+        return
+    table = FavoriteCounter.__table__
+    dialect_insert = conflict_insert()
+    if dialect_insert is not None:
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.kind, table.c.target_id],
+            set_={"total": table.c.total + stmt.excluded.total},
+        )
+        db.session.execute(stmt, rows)
+        return
+    for row in rows:
+        result = db.session.execute(
+            update(table)
+            .where(table.c.kind == kind, table.c.target_id == row["target_id"])
+            .values(total=table.c.total + row["total"])
+        )
+        if not result.rowcount:
+            db.session.execute(insert(table), row)
+
+
+def favorite_target(favorite):
+    """(kind, target id) the favorite points to, None when it points to nothing."""
+    for kind, (_, column_name) in FAVORITE_TARGETS.items():
+        target_id = getattr(favorite, column_name)
+        if target_id is not None:
+            return kind, target_id
+    return None
+
+
+def move_counters(before, after):
+    """Moves one favorite from the counter of target before to the one of after, (kind, id) or None."""
+    if before == after:
+        return
+    if before is not None:
+        change_counters(before[0], {before[1]: -1})
+    if after is not None:
+        change_counters(after[0], {after[1]: 1})
+
+
+def _changed_by_type(results, status, delta):
+    changed = {}
+    for result in results:
+        if result["status"] == status:
+            changed.setdefault(result["type"], {})[result["id"]] = delta
+    for kind, deltas in changed.items():
+        change_counters(kind, deltas)
+
+
+def rebuild_counters(connection):
+    """Recomputes every counter from favorite (connection can be a session too)."""
+    table = FavoriteCounter.__table__
+    connection.execute(delete(table))
+    for kind, (_, column_name) in FAVORITE_TARGETS.items():
+        column = getattr(Favorite, column_name)
+        connection.execute(insert(table).from_select(
+            ["kind", "target_id", "total"],
+            select(literal(kind), column, func.count()).where(column.is_not(None)).group_by(column),
+        ))
+
+
+def top_favorites(kind, limit):
+    counter_kind, model, name = POPULAR_TARGETS[kind]
+    rows = db.session.execute(
+        select(model.id, name, FavoriteCounter.total)
+        .join(model, model.id == FavoriteCounter.target_id)
+        .where(FavoriteCounter.kind == counter_kind, FavoriteCounter.total > 0)
+        .order_by(FavoriteCounter.total.desc(), FavoriteCounter.target_id.desc())
+        .limit(limit)
+    )
+    return [{"type": counter_kind, "id": target_id, "name": target_name, "favorites": total} for target_id, target_name, total in rows]
+
+
+@click.command("rebuild-counters")
+@with_appcontext
+def rebuild_counters_command():
+    """Recompute the popularity counters from the favorite table."""
+    rebuild_counters(db.session)
+    db.session.commit()
+    click.echo(f"{db.session.scalar(select(func.count()).select_from(FavoriteCounter))} counters rebuilt")
+
+
+def parse_batch(body):
+    items = body.get("items") if isinstance(body, dict) else body
+    if not isinstance(items, list) or not items:
+        raise APIException("You need specify a list of favorites: [{\"type\": \"people\", \"id\": 1}, ...]", status_code=400)
+    if len(items) > MAX_BATCH_ITEMS:
+        raise APIException(f"A batch can have at most {MAX_BATCH_ITEMS} favorites", status_code=400)
+
+    results = []
+    for item in items:
+        kind = item.get("type") if isinstance(item, dict) else None
+        target_id = item.get("id") if isinstance(item, dict) else None
+        valid = kind in FAVORITE_TARGETS and isinstance(target_id, int) and not isinstance(target_id, bool)
+        results.append({"type": kind, "id": target_id, "status": None if valid else "invalid"})
+    return results
+
+
+def _pending_by_type(results):
+    # type -> {target id: [results of that target]} for the items still to resolve
+    pending = {}
+    for result in results:
+        if result["status"] is None:
+            pending.setdefault(result["type"], {}).setdefault(result["id"], []).append(result)
+    return pending
+
+
+def _existing_favorites(theid, column, ids):
+    return set(db.session.execute(
+        select(column).where(Favorite.user_id == theid, column.in_(ids))
+    ).scalars())
+
+
+def _mark(entries, status):
+    # Repeated items in the same batch only count once
+    entries[0]["status"] = status
+    for entry in entries[1:]:
+        entry["status"] = "already-exists" if status == "created" else status
+
+
+def add_favorites(theid, results):
+    rows = []
+    for kind, targets in _pending_by_type(results).items():
+        model, column_name = FAVORITE_TARGETS[kind]
+        column = getattr(Favorite, column_name)
+        found = set(db.session.execute(select(model.id).where(model.id.in_(targets))).scalars())
+        existing = _existing_favorites(theid, column, found)
+        for target_id, entries in targets.items():
+            if target_id not in found:
+                _mark(entries, "not-found")
+            elif target_id in existing:
+                _mark(entries, "already-exists")
+            else:
+                _mark(entries, "created")
+                rows.append({"user_id": theid, "people_id": None, "planet_id": None, "vehicle_id": None, column_name: target_id})
+    if not rows:
+        return results
+
+    dialect_insert = conflict_insert()
+    if dialect_insert is not None:
+        # A concurrent request may have added some of them meanwhile
+        stmt = dialect_insert(Favorite.__table__).on_conflict_do_nothing().returning(
+            Favorite.people_id, Favorite.planet_id, Favorite.vehicle_id
+        )
+        inserted = {tuple(row) for row in db.session.execute(stmt, rows)}
+        for result in results:
+            if result["status"] == "created":
+                _, column_name = FAVORITE_TARGETS[result["type"]]
+                key = tuple(result["id"] if name == column_name else None for name in ("people_id", "planet_id", "vehicle_id"))
+                if key not in inserted:
+                    result["status"] = "already-exists"
+        _changed_by_type(results, "created", 1)
+        return results
+
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(Favorite.__table__), rows)
+    except IntegrityError:
+        raise APIException("The favorites changed while saving them, please retry", status_code=409)
+    _changed_by_type(results, "created", 1)
+    return results
+
+
+def remove_favorites(theid, results):
+    returning = db.session.get_bind().dialect.delete_returning
+    for kind, targets in _pending_by_type(results).items():
+        _, column_name = FAVORITE_TARGETS[kind]
+        column = getattr(Favorite, column_name)
+        # Only what this request removed counts, a concurrent delete may have taken some first
+        if returning:
+            removed = set(db.session.execute(
+                delete(Favorite).where(Favorite.user_id == theid, column.in_(list(targets))).returning(column),
+                execution_options={"synchronize_session": False},
+            ).scalars())
+        else:
+            removed = {target_id for target_id in targets if db.session.execute(
+                delete(Favorite).where(Favorite.user_id == theid, column == target_id),
+                execution_options={"synchronize_session": False},
+            ).rowcount}
+        for target_id, entries in targets.items():
+            for entry in entries:
+                entry["status"] = "not-found"
+            if target_id in removed:
+                entries[0]["status"] = "deleted"
+    _changed_by_type(results, "deleted", -1)
+    return results
@@ -0,0 +1,114 @@
+"""
+Cheap answers for the requests that come most often and change least.
+
+The sitemap at / (HTML, or ?format=json with every route, its methods and parameter
+patterns) only depends on the registered routes: each worker builds it once and then
+serves the same bytes with an ETag.
+
+/healthz says the process is up without touching anything. /readyz also checks the
+database with a SELECT 1, but the result is kept for HEALTH_CHECK_TTL seconds and only
+one thread at a time runs the check, so frequent probes do not each check out a
+connection.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from flask import current_app, request
+from models import db
+from utils import APIException, generate_sitemap, sitemap_routes
+
+logger = logging.getLogger(__name__)
+
+SITEMAP_FORMATS = {
+    "html": "text/html; charset=utf-8",
+    "json": "application/json",
+}
+
+
+class Sitemap:
+    def __init__(self):
+        self.pages = {}
+
+    def response(self, app):
+        page_format = request.args.get("format", "html")
+        if page_format not in SITEMAP_FORMATS:
+            raise APIException(f"format must be one of: {', '.join(SITEMAP_FORMATS)}", status_code=400)
+        # Links carry the prefix the app is mounted at, one copy per prefix
+        key = (request.script_root, page_format)
+        page = self.pages.get(key)
+        if page is None:
+            if page_format == "json":
+                payload = current_app.json.dumps_bytes({"routes": sitemap_routes(app)})
+            else:
+                payload = generate_sitemap(app).encode("utf-8")
+            page = (payload, hashlib.sha1(payload).hexdigest()[:16])
+            self.pages[key] = page
+        payload, etag = page
+        response = current_app.response_class(payload, content_type=SITEMAP_FORMATS[page_format])
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = current_app.config["CACHE_CONTROL"]
+        return response.make_conditional(request)
+
+
+class ReadinessCheck:
+    def __init__(self):
+        self.ttl = 2.0
+        self.result = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault("HEALTH_CHECK_TTL", float(os.getenv("HEALTH_CHECK_TTL", 2)))
+        self.ttl = app.config["HEALTH_CHECK_TTL"]
+        app.extensions["readiness_check"] = self
+
+    def _probe(self):
+        start = time.perf_counter()
+        try:
+            with db.engine.connect() as connection:
+                connection.exec_driver_sql("SELECT 1")
+            error = None
+        except Exception as err:
+            logger.warning("Readiness check failed: %s", err)
+            error = str(err).splitlines()[0]
+        self.result = {
+            "error": error,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 3),
+            "checked_at": time.monotonic(),
+        }
+        return self.result
+
+    def check(self):
+        """Result of the last database check, run again once it is older than the TTL."""
+        result = self.result
+        if result is not None and time.monotonic() - result["checked_at"] < self.ttl:
+            return result
+        # While a check is running the others answer with the previous result
+        if not self._lock.acquire(blocking=result is None):
+            return result
+        try:
+            result = self.result
+            if result is None or time.monotonic() - result["checked_at"] >= self.ttl:
+                result = self._probe()
+            return result
+        finally:
+            self._lock.release()
+
+    def response(self):
+        result = self.check()
+        body = {
+            "status": "ready" if result["error"] is None else "unavailable",
+            "database": {
+                "ok": result["error"] is None,
+                "latency_ms": result["latency_ms"],
+                "age_seconds": round(time.monotonic() - result["checked_at"], 3),
+            },
+        }
+        if result["error"] is not None:
+            body["message"] = f"Database unavailable: {result['error']}"
+        return body, 200 if result["error"] is None else 503
+
+
+sitemap = Sitemap()
+readiness_check = ReadinessCheck()
@@ -0,0 +1,205 @@
+"""
+Request and SQL instrumentation exported in Prometheus text format (GET /metrics).
+
+Every request records its latency, status, response size, and the number and total
+time of the SQL statements it ran (counted with SQLAlchemy engine events, so the
+replica engines are included). Routes are labelled with their URL rule, not the
+path, to keep the number of series bounded.
+
+The native routes of asgi.py, which run without a Flask request, are recorded the same
+way: their RequestStats lives in a context variable (see start_native_request).
+
+The numbers are kept in memory by each worker process and labelled with its pid, so
+a scrape through the load balancer returns the series of whichever worker answered.
+Set METRICS_ENABLED=0 to turn the instrumentation off.
+"""
+import bisect
+import contextvars
+import os
+import threading
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+UNMATCHED_ROUTE = "<unmatched>"
+MAX_RECORDED_STATEMENTS = 1000
+
+# RequestStats of the native ASGI request running in this task, the SQLAlchemy async
+# engine runs its statements in the same context
+_native_request_stats = contextvars.ContextVar("native_request_stats", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.series = {}
+
+    def inc(self, values, amount=1):
+        self.series[values] = self.series.get(values, 0) + amount
+
+    def render(self, base):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for values, total in sorted(self.series.items()):
+            yield f"{self.name}{_labels(self.labels, values, base)} {total}"
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [count per bucket..., count above the last bucket, sum]
+        self.series = {}
+
+    def observe(self, values, value):
+        counts = self.series.get(values)
+        if counts is None:
+            counts = self.series[values] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def render(self, base):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for values, counts in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = f'{base},le="{bound}"'
+                yield f"{self.name}_bucket{_labels(self.labels, values, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, values, base)} {counts[-1]}"
+            yield f"{self.name}_count{_labels(self.labels, values, base)} {cumulative}"
+
+
+class RequestStats:
+    """What the SQL event hooks accumulate for the request being served (in g)."""
+
+    __slots__ = ("start", "sql_statements", "sql_seconds", "statements")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        # (engine, statement, parameters, executemany, seconds) when a consumer asks for them
+        self.statements = None
+
+
+def current_request_stats():
+    if has_request_context():
+        return g.get("request_stats")
+    return _native_request_stats.get()
+
+
+def start_native_request(record_statements=False):
+    """RequestStats of a request served outside Flask, for the rest of the current context."""
+    stats = RequestStats()
+    if record_statements:
+        stats.statements = []
+    _native_request_stats.set(stats)
+    return stats
+
+
+def _start_request_stats():
+    g.request_stats = RequestStats()
+
+
+def track_requests(app):
+    """Installs the SQL event hooks and the per-request RequestStats, once per app."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    if not app.extensions.get("request_stats"):
+        app.before_request(_start_request_stats)
+        app.extensions["request_stats"] = True
+
+
+class RequestMetrics:
+    def __init__(self, app=None):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.requests = Counter("http_requests_total", "Requests served.", ("method", "route", "status"))
+        self.latency = Histogram(
+            "http_request_duration_seconds", "Time to build the response.", ("method", "route"), LATENCY_BUCKETS
+        )
+        self.response_bytes = Counter(
+            "http_response_bytes_total", "Bytes of the response bodies with a known length.", ("method", "route")
+        )
+        self.sql_statements = Histogram(
+            "http_request_sql_statements", "SQL statements run per request.", ("method", "route"), SQL_STATEMENT_BUCKETS
+        )
+        self.sql_seconds = Histogram(
+            "http_request_sql_seconds", "Time spent in SQL statements per request.", ("method", "route"), LATENCY_BUCKETS
+        )
+        self.metrics = (self.requests, self.latency, self.response_bytes, self.sql_statements, self.sql_seconds)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("METRICS_ENABLED", os.getenv("METRICS_ENABLED", "1").lower() in ("1", "true", "yes", "on"))
+        self.enabled = app.config["METRICS_ENABLED"]
+        if self.enabled:
+            track_requests(app)
+            app.after_request(self._after_request)
+        app.extensions["request_metrics"] = self
+
+    def _after_request(self, response):
+        stats = g.get("request_stats")
+        if stats is not None:
+            route = request.url_rule.rule if request.url_rule is not None else UNMATCHED_ROUTE
+            self.record(request.method, route, response.status_code, response.content_length, stats)
+        return response
+
+    def record(self, method, route, status, size, stats):
+        """Counts a finished request, size is None when the length of the body is unknown."""
+        elapsed = time.perf_counter() - stats.start
+        labels = (method, route)
+        with self._lock:
+            self.requests.inc((method, route, str(status)))
+            self.latency.observe(labels, elapsed)
+            self.sql_statements.observe(labels, stats.sql_statements)
+            self.sql_seconds.observe(labels, stats.sql_seconds)
+            if size is not None:
+                self.response_bytes.inc(labels, size)
+
+    def render(self):
+        base = f'pid="{os.getpid()}"'
+        with self._lock:
+            lines = [line for metric in self.metrics for line in metric.render(base)]
+        return "\n".join(lines) + "\n"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "metrics_start", None)
+    stats = current_request_stats()
+    if start is not None and stats is not None:
+        elapsed = time.perf_counter() - start
+        stats.sql_statements += 1
+        stats.sql_seconds += elapsed
+        if stats.statements is not None and len(stats.statements) < MAX_RECORDED_STATEMENTS:
+            stats.statements.append((conn.engine, statement, parameters, executemany, elapsed))
+
+
+request_metrics = RequestMetrics()
@@ -4,11 +4,29 @@ from sqlalchemy.orm import Mapped, mapped_column, relationship
 from typing import List
 import enum
 from datetime import datetime, UTC
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+# Las consultas de los endpoints de solo lectura pueden ir a una réplica (ver replicas.py)
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+
+def serialize_value(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def serialize_only(item, fields):
+    # Used with ?fields=, only touches the columns that were loaded
+    return {name: serialize_value(getattr(item, name)) for name in fields}
 
 
 class User(db.Model):
+    # Campos públicos, los únicos aceptados en ?fields=
+    serialize_fields = ("id", "username", "name", "email", "subscription_date", "upgrade")
+
     id: Mapped[int] = mapped_column(primary_key=True)
     username: Mapped[str] = mapped_column(String(100), unique=True, nullable=False)
     name: Mapped[str] = mapped_column(String(100), nullable=False)
@@ -23,14 +41,16 @@ class User(db.Model):
     def __repr__ (self):
         return self.name
 
-    def serialize(self):
+    def serialize(self, fields=None):
+        if fields is not None:
+            return serialize_only(self, fields)
         return {
             "id": self.id,
             "username": self.username,
             "name": self.name,
             "email": self.email,
-            "subscription_date": str(self.subscription_date),
-            "upgrade": self.upgrade,
+            "subscription_date": self.subscription_date.isoformat(),
+            "upgrade": self.upgrade.isoformat(),
         }
 
 
@@ -41,6 +61,14 @@ class GenderEnum(enum.Enum):
 
 
 class People(db.Model):
+    # Filtros ?gender=, ?height_gte=... y orden ?sort=-height, cada uno con su índice (columna, id)
+    filter_fields = ("gender", "height")
+    __table_args__ = (
+        db.Index("ix_people_gender_id", "gender", "id"),
+        db.Index("ix_people_height_id", "height", "id"),
+    )
+    serialize_fields = ("id", "full_name", "gender", "height", "description", "url")
+
     id: Mapped[int] = mapped_column(primary_key=True)
     full_name: Mapped[str] = mapped_column(String(100), unique=True, nullable=False)
     gender: Mapped[str] = mapped_column(Enum(GenderEnum), nullable=False)
@@ -54,7 +82,9 @@ class People(db.Model):
     def __repr__ (self):
         return self.full_name
 
-    def serialize(self):
+    def serialize(self, fields=None):
+        if fields is not None:
+            return serialize_only(self, fields)
         return {
             "id": self.id,
             "full_name": self.full_name,
@@ -66,6 +96,14 @@ class People(db.Model):
 
 
 class Planet(db.Model):
+    # Filtros ?climate=, ?population_gte=... y orden ?sort=-population, cada uno con su índice (columna, id)
+    filter_fields = ("climate", "population")
+    __table_args__ = (
+        db.Index("ix_planet_climate_id", "climate", "id"),
+        db.Index("ix_planet_population_id", "population", "id"),
+    )
+    serialize_fields = ("id", "name", "climate", "population", "description", "url")
+
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(100), unique=True, nullable=False)
     climate: Mapped[str] = mapped_column(String(100), default= "sin información")
@@ -79,7 +117,9 @@ class Planet(db.Model):
     def __repr__ (self):
         return self.name
 
-    def serialize(self):
+    def serialize(self, fields=None):
+        if fields is not None:
+            return serialize_only(self, fields)
         return {
             "id": self.id,
             "name": self.name,
@@ -91,6 +131,14 @@ class Planet(db.Model):
 
 
 class Vehicle(db.Model):
+    # Filtros ?model=, ?capacity_gte=... y orden ?sort=-capacity, cada uno con su índice (columna, id)
+    filter_fields = ("model", "capacity")
+    __table_args__ = (
+        db.Index("ix_vehicle_model_id", "model", "id"),
+        db.Index("ix_vehicle_capacity_id", "capacity", "id"),
+    )
+    serialize_fields = ("id", "name", "model", "capacity", "description", "url")
+
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(100), nullable=False, unique=True)
     model: Mapped[str] = mapped_column(String(100), default= "Sin información")
@@ -104,7 +152,9 @@ class Vehicle(db.Model):
     def __repr__ (self):
         return self.name
 
-    def serialize(self):
+    def serialize(self, fields=None):
+        if fields is not None:
+            return serialize_only(self, fields)
         return {
             "id": self.id,
             "name": self.name,
@@ -116,10 +166,17 @@ class Vehicle(db.Model):
 
 
 class Favorite(db.Model):
+    # Un mismo elemento solo puede estar una vez en los favoritos de cada usuario
+    __table_args__ = (
+        db.Index("ix_favorite_user_people", "user_id", "people_id", unique=True),
+        db.Index("ix_favorite_user_planet", "user_id", "planet_id", unique=True),
+        db.Index("ix_favorite_user_vehicle", "user_id", "vehicle_id", unique=True),
+    )
+
     id: Mapped[int] = mapped_column(primary_key=True)
 
     # Creación del foreignkey
-    user_id: Mapped[int] = mapped_column(db.ForeignKey("user.id"), nullable=False)
+    user_id: Mapped[int] = mapped_column(db.ForeignKey("user.id"), nullable=False, index=True)
     planet_id: Mapped[int] = mapped_column(db.ForeignKey("planet.id"), nullable=True) 
     people_id: Mapped[int] = mapped_column(db.ForeignKey("people.id"), nullable=True) 
     vehicle_id: Mapped[int] = mapped_column(db.ForeignKey("vehicle.id"), nullable=True) 
@@ -159,3 +216,31 @@ class Favorite(db.Model):
             data["details"] = self.vehicle_item.serialize()
         
         return data
+
+
+class FavoriteCounter(db.Model):
+    # Cuántos usuarios tienen cada elemento en favoritos, se actualiza junto con favorite
+    __tablename__ = "favorite_counter"
+    __table_args__ = (
+        db.Index("ix_favorite_counter_rank", "kind", "total", "target_id"),
+    )
+
+    kind: Mapped[str] = mapped_column(String(20), primary_key=True)
+    target_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    total: Mapped[int] = mapped_column(nullable=False, default=0)
+
+    def __repr__(self):
+        return f"{self.kind} {self.target_id}: {self.total}"
+
+
+class TableVersion(db.Model):
+    # Versión de cada tabla con TABLE_VERSIONS_BACKEND=database (ver versions.py),
+    # cambia en la misma transacción que la escritura
+    __tablename__ = "table_version"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    version: Mapped[str] = mapped_column(String(32), nullable=False)
+    changed_at: Mapped[float] = mapped_column(nullable=False)
+
+    def __repr__(self):
+        return f"{self.name}: {self.version}"
@@ -0,0 +1,139 @@
+"""
+Connection pool configuration and per-worker pool metrics.
+
+SQLALCHEMY_ENGINE_OPTIONS is built from a preset (DB_POOL_PRESET=development or
+production) that each DB_POOL_* variable can override:
+
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING
+
+The pool class records how long each checkout waited, the timeouts, and warns in the
+log when every connection is in use.
+"""
+import logging
+import os
+import threading
+import time
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+POOL_PRESETS = {
+    "development": {
+        "pool_size": 5,
+        "max_overflow": 5,
+        "pool_timeout": 10,
+        "pool_recycle": 1800,
+        "pool_pre_ping": False,
+    },
+    # A few persistent connections per gunicorn worker, fail fast instead of queueing
+    # requests for long, and recycle before the server or a proxy drops idle connections
+    "production": {
+        "pool_size": 10,
+        "max_overflow": 5,
+        "pool_timeout": 5,
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    },
+}
+
+
+def _bool(value):
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+ENV_OPTIONS = {
+    "DB_POOL_SIZE": ("pool_size", int),
+    "DB_MAX_OVERFLOW": ("max_overflow", int),
+    "DB_POOL_TIMEOUT": ("pool_timeout", int),
+    "DB_POOL_RECYCLE": ("pool_recycle", int),
+    "DB_POOL_PRE_PING": ("pool_pre_ping", _bool),
+}
+EXHAUSTED_WARNING_INTERVAL = 10
+
+
+class InstrumentedQueuePool(QueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_overflow = kwargs.get("max_overflow", 10)
+        self.timeout_seconds = kwargs.get("timeout", 30)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._last_warning = 0.0
+
+    def connect(self):
+        if self.checkedout() >= self.size() + self.max_overflow:
+            now = time.monotonic()
+            if now - self._last_warning > EXHAUSTED_WARNING_INTERVAL:
+                self._last_warning = now
+                logger.warning(
+                    "Connection pool exhausted in worker %s: %s connections in use, requests are waiting",
+                    os.getpid(), self.checkedout(),
+                )
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            logger.error("Timed out after %ss waiting for a database connection in worker %s", self.timeout_seconds, os.getpid())
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+    def stats(self):
+        return {
+            "size": self.size(),
+            "max_overflow": self.max_overflow,
+            "timeout": self.timeout_seconds,
+            "checked_in": self.checkedin(),
+            "checked_out": self.checkedout(),
+            "overflow": max(self.overflow(), 0),
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_total_ms": round(self.wait_total * 1000, 3),
+            "wait_avg_ms": round(self.wait_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+        }
+
+
+def engine_options(database_uri, environ=os.environ):
+    preset = environ.get("DB_POOL_PRESET", "development")
+    if preset not in POOL_PRESETS:
+        raise ValueError(f"DB_POOL_PRESET must be one of: {', '.join(POOL_PRESETS)}")
+    options = dict(POOL_PRESETS[preset])
+    for variable, (option, cast) in ENV_OPTIONS.items():
+        if environ.get(variable):
+            options[option] = cast(environ[variable])
+
+    if database_uri in ("sqlite://", "sqlite:///:memory:"):
+        # In-memory SQLite keeps one connection per thread, queue pool options do not apply
+        return {"pool_pre_ping": options["pool_pre_ping"]}
+    options["poolclass"] = InstrumentedQueuePool
+    return options
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    if isinstance(pool, InstrumentedQueuePool):
+        return pool.stats()
+    return {"status": pool.status()}
+
+
+def dispose_after_fork(app):
+    """Gives a forked worker its own connections.
+
+    A preloaded app may have connected in the parent (the catalog snapshot, for
+    example); sharing those sockets between processes corrupts them. close=False
+    leaves them open for the parent and the worker starts with empty pools."""
+    with app.app_context():
+        for engine in app.extensions["sqlalchemy"].engines.values():
+            engine.dispose(close=False)
+    app.extensions["replica_router"].dispose()
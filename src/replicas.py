@@ -0,0 +1,142 @@
+"""
+Read replica routing.
+
+With DATABASE_REPLICA_URLS set (comma separated URLs), the handlers decorated with
+@read_only run their queries on the replicas in round robin. Replicas are health
+checked with a cached SELECT 1 and skipped while they fail. Writes, and reads of a
+client that wrote during the last READ_YOUR_WRITES_SECONDS (tracked with a cookie),
+stay on the primary. So do the reads of a table written by anyone during that time
+(see versions.primary_after_write), their ETag already names the new version.
+"""
+import functools
+import itertools
+import logging
+import os
+import threading
+import time
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine
+
+logger = logging.getLogger(__name__)
+
+PRIMARY_COOKIE = "db_primary_until"
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self.urls = []
+        self.engine_options = {}
+        self.engines = []
+        self.health = {}
+        self.check_interval = 5
+        self.read_your_writes_seconds = 5
+        self._cycle = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        urls = os.getenv("DATABASE_REPLICA_URLS", "")
+        app.config.setdefault("DATABASE_REPLICA_URLS", [
+            url.strip().replace("postgres://", "postgresql://") for url in urls.split(",") if url.strip()
+        ])
+        app.config.setdefault("REPLICA_HEALTH_CHECK_INTERVAL", int(os.getenv("REPLICA_HEALTH_CHECK_INTERVAL", 5)))
+        app.config.setdefault("READ_YOUR_WRITES_SECONDS", int(os.getenv("READ_YOUR_WRITES_SECONDS", 5)))
+        self.urls = app.config["DATABASE_REPLICA_URLS"]
+        self.check_interval = app.config["REPLICA_HEALTH_CHECK_INTERVAL"]
+        self.read_your_writes_seconds = app.config["READ_YOUR_WRITES_SECONDS"]
+        self.engine_options = dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+        app.after_request(self._remember_write)
+        app.extensions["replica_router"] = self
+
+    @property
+    def enabled(self):
+        return bool(self.urls)
+
+    def _engines(self):
+        if not self.engines:
+            with self._lock:
+                if not self.engines:
+                    self.engines = [create_engine(url, **self.engine_options) for url in self.urls]
+                    self._cycle = itertools.cycle(range(len(self.engines)))
+        return self.engines
+
+    def _healthy(self, index, engine):
+        healthy, checked_at = self.health.get(index, (True, 0.0))
+        now = time.monotonic()
+        if now - checked_at < self.check_interval:
+            return healthy
+        try:
+            with engine.connect() as connection:
+                connection.exec_driver_sql("SELECT 1")
+            healthy = True
+        except Exception as err:
+            if self.health.get(index, (True, 0.0))[0]:
+                logger.warning("Read replica %s is down, using the others: %s", engine.url.render_as_string(), err)
+            healthy = False
+        self.health[index] = (healthy, now)
+        return healthy
+
+    def pick(self):
+        """Next healthy replica engine, or None to use the primary."""
+        engines = self._engines()
+        for _ in range(len(engines)):
+            index = next(self._cycle)
+            if self._healthy(index, engines[index]):
+                return engines[index]
+        return None
+
+    def dispose(self):
+        for engine in self.engines:
+            engine.dispose(close=False)
+
+    def stats(self):
+        return [
+            {
+                "url": engine.url.render_as_string(),
+                "healthy": self.health.get(index, (True, 0.0))[0],
+                "pool": engine.pool.status(),
+            }
+            for index, engine in enumerate(self.engines)
+        ]
+
+    def _remember_write(self, response):
+        # After a write the client reads from the primary until replicas catch up
+        if self.enabled and request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+            until = time.time() + self.read_your_writes_seconds
+            response.set_cookie(PRIMARY_COOKIE, str(until), max_age=self.read_your_writes_seconds, httponly=True)
+        return response
+
+    def use_replica(self):
+        if not self.enabled or not has_request_context() or not g.get("read_only", False):
+            return False
+        if g.get("primary_only", False):
+            return False
+        try:
+            return float(request.cookies.get(PRIMARY_COOKIE, 0)) < time.time()
+        except ValueError:
+            return True
+
+
+replica_router = ReplicaRouter()
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and replica_router.use_replica():
+            engine = g.get("replica_engine")
+            if engine is None:
+                # One replica for the whole request so its reads are consistent
+                engine = replica_router.pick()
+                g.replica_engine = engine if engine is not None else False
+            if engine:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_only(view):
+    """Marks a handler whose queries can be served by a read replica."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_only = True
+        return view(*args, **kwargs)
+    return wrapper
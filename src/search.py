@@ -0,0 +1,163 @@
+"""
+Full-text search over the People, Planet and Vehicle catalogs.
+
+Three backends, chosen from the database in use:
+
+- PostgreSQL: tsvector expressions backed by GIN indexes (migration a7d4e9c2f610).
+- SQLite: FTS5 external content tables kept in sync by triggers (same migration).
+- Anything else, or a database created without the migrations: an in-process
+  inverted index, rebuilt whenever the table versions say the catalog changed.
+"""
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from sqlalchemy import select, text
+from models import db, People, Planet, Vehicle
+from utils import APIException
+from versions import table_versions, primary_after_write
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# type -> model, title column, searchable columns (most relevant first).
+# The PostgreSQL index expressions in the migration are built from the same columns.
+SEARCH_TARGETS = {
+    "people": (People, "full_name", ("full_name", "description")),
+    "planet": (Planet, "name", ("name", "climate", "description")),
+    "vehicle": (Vehicle, "name", ("name", "model", "description")),
+}
+
+
+def tokenize(value):
+    return TOKEN_RE.findall(value.lower()) if value else []
+
+
+def pg_vector(columns):
+    weights = ("A", "B", "C")
+    return " || ".join(
+        f"setweight(to_tsvector('simple', coalesce({column}, '')), '{weights[min(i, 2)]}')"
+        for i, column in enumerate(columns)
+    )
+
+
+def _search_postgresql(kind, terms, limit):
+    model, title, columns = SEARCH_TARGETS[kind]
+    table = model.__table__.name
+    vector = pg_vector(columns)
+    query = " & ".join(f"{term}:*" if i == len(terms) - 1 else term for i, term in enumerate(terms))
+    rows = db.session.execute(text(
+        f"SELECT id, {title}, ts_rank_cd({vector}, q) AS score "
+        f"FROM {table}, to_tsquery('simple', :query) AS q "
+        f"WHERE {vector} @@ q ORDER BY score DESC LIMIT :limit"
+    ), {"query": query, "limit": limit})
+    return [(kind, row[0], row[1], float(row[2])) for row in rows]
+
+
+def _search_fts5(kind, terms, limit):
+    model, title, columns = SEARCH_TARGETS[kind]
+    table = model.__table__.name
+    # Every term is quoted so user input can never be parsed as FTS5 syntax
+    query = " ".join(f'"{term}"' for term in terms[:-1]) + f' "{terms[-1]}"*'
+    weights = ", ".join("10.0" if i == 0 else "1.0" for i in range(len(columns)))
+    rows = db.session.execute(text(
+        f"SELECT {table}.id, {table}.{title}, -bm25({table}_fts, {weights}) AS score "
+        f"FROM {table}_fts JOIN {table} ON {table}.id = {table}_fts.rowid "
+        f"WHERE {table}_fts MATCH :query ORDER BY score DESC LIMIT :limit"
+    ), {"query": query.strip(), "limit": limit})
+    return [(kind, row[0], row[1], float(row[2])) for row in rows]
+
+
+class InvertedIndex:
+    """Last resort backend: token -> {id: weight} per catalog, built in memory."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indexes = {}
+
+    def _build(self, kind):
+        model, title, columns = SEARCH_TARGETS[kind]
+        postings = defaultdict(dict)
+        titles = {}
+        attributes = [getattr(model, column) for column in columns]
+        result = db.session.execute(select(model.id, *attributes).execution_options(yield_per=1000))
+        for row in result:
+            titles[row[0]] = row[1]
+            for position, value in enumerate(row[1:]):
+                weight = 10.0 if position == 0 else 1.0
+                for token in tokenize(value):
+                    postings[token][row[0]] = postings[token].get(row[0], 0.0) + weight
+        return postings, sorted(postings), titles
+
+    def _index(self, kind):
+        table = SEARCH_TARGETS[kind][0].__table__.name
+        version = table_versions.get(table)
+        cached = self._indexes.get(kind)
+        if cached is None or cached[0] != version:
+            with self._lock:
+                cached = self._indexes.get(kind)
+                if cached is None or cached[0] != version:
+                    primary_after_write((table,))
+                    cached = (version, *self._build(kind))
+                    self._indexes[kind] = cached
+        return cached[1:]
+
+    def search(self, kind, terms, limit):
+        postings, tokens, titles = self._index(kind)
+        scores = None
+        for i, term in enumerate(terms):
+            matches = dict(postings.get(term, {}))
+            if i == len(terms) - 1:
+                # Prefix match on the last term, like the SQL backends
+                start = bisect_left(tokens, term)
+                while start < len(tokens) and tokens[start].startswith(term):
+                    for item_id, weight in postings[tokens[start]].items():
+                        matches[item_id] = max(matches.get(item_id, 0.0), weight)
+                    start += 1
+            if scores is None:
+                scores = matches
+            else:
+                scores = {item_id: score + matches[item_id] for item_id, score in scores.items() if item_id in matches}
+            if not scores:
+                return []
+        best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [(kind, item_id, titles[item_id], score) for item_id, score in best]
+
+
+inverted_index = InvertedIndex()
+_backends = {}
+
+
+def _backend():
+    engine = db.session.get_bind()
+    backend = _backends.get(engine.url)
+    if backend is None:
+        if engine.dialect.name == "postgresql":
+            backend = _search_postgresql
+        elif engine.dialect.name == "sqlite" and db.session.execute(text(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = 'people_fts'"
+        )).scalar():
+            backend = _search_fts5
+        else:
+            backend = inverted_index.search
+        _backends[engine.url] = backend
+    return backend
+
+
+def search(q, kinds, limit=DEFAULT_SEARCH_LIMIT):
+    terms = tokenize(q)
+    if not terms:
+        raise APIException("You need specify a search text in q", status_code=400)
+    unknown = [kind for kind in kinds if kind not in SEARCH_TARGETS]
+    if unknown:
+        raise APIException(f"type must be one of: {', '.join(SEARCH_TARGETS)}", status_code=400)
+    backend = _backend()
+    results = []
+    for kind in kinds:
+        results.extend(backend(kind, terms, limit))
+    results.sort(key=lambda result: -result[3])
+    return [
+        {"type": kind, "id": item_id, "name": name, "score": score}
+        for kind, item_id, name, score in results[:limit]
+    ]
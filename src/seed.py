@@ -0,0 +1,243 @@
+"""
+flask seed: fills user, people, planet, vehicle and favorite with deterministic
+synthetic data, fast enough to reproduce production sized catalogs locally.
+
+    flask seed --people 1000000 --users 100000 --favorites 50 --reset
+
+PostgreSQL is loaded with COPY, any other database with executemany in batches,
+everything in one transaction. The secondary indexes (and the full text search
+triggers on SQLite) are dropped before the load and rebuilt once at the end, and
+the favorite counters are recomputed.
+"""
+import csv
+import io
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import Enum, func, select, text
+from models import db, User, People, Planet, Vehicle, Favorite, FavoriteCounter, GenderEnum
+from favorites import rebuild_counters
+from versions import table_versions
+
+SEED_CHUNK = 50000
+BASE_DATE = datetime(2024, 1, 1)
+ADJECTIVES = ("brave", "ancient", "reckless", "wise", "young", "exiled", "loyal", "mysterious", "rebel", "imperial")
+ROLES = ("pilot", "smuggler", "jedi", "senator", "bounty hunter", "droid", "mechanic", "trooper", "scout", "merchant")
+PLACES = ("Tatooine", "Coruscant", "Naboo", "Hoth", "Endor", "Kashyyyk", "Dagobah", "Bespin", "Jakku", "Mustafar")
+CLIMATES = ("arid", "temperate", "tropical", "frozen", "murky", "windy", "hot", "humid", "polluted", "unknown")
+MODELS = ("Speeder", "Walker", "Fighter", "Shuttle", "Freighter", "Cruiser", "Skiff", "Bike", "Gunship", "Transport")
+
+
+def favorite_target(user, k, counts):
+    """(Favorite column, target id) of the k-th seeded favorite of a user, unique per user."""
+    column, count = (("people_id", counts["people"]), ("planet_id", counts["planet"]), ("vehicle_id", counts["vehicle"]))[k % 3]
+    return column, (user * 7919 + k // 3) % count + 1
+
+
+def _users(counts, rng):
+    for i in range(1, counts["user"] + 1):
+        date = BASE_DATE + timedelta(minutes=i)
+        yield (i, f"user{i}", f"User {i}", f"user{i}@example.com", date, date, f"password{i}")
+
+
+def _people(counts, rng):
+    genders = list(GenderEnum)
+    descriptions = [f"A {adjective} {role} from {place}" for adjective, role, place in itertools.product(ADJECTIVES, ROLES, PLACES)]
+    for i in range(1, counts["people"] + 1):
+        yield (
+            i, f"Person {i}", rng.choice(genders), rng.choice(descriptions),
+            round(0.5 + 2 * rng.random(), 2), f"https://swapi.dev/api/people/{i}",
+        )
+
+
+def _planets(counts, rng):
+    descriptions = [f"A {climate} world near {place}" for climate, place in itertools.product(CLIMATES, PLACES)]
+    for i in range(1, counts["planet"] + 1):
+        yield (
+            i, f"Planet {i}", rng.choice(CLIMATES), rng.choice(descriptions),
+            rng.randrange(10 ** 9), f"https://swapi.dev/api/planets/{i}",
+        )
+
+
+def _vehicles(counts, rng):
+    descriptions = {
+        model: [f"A {adjective} {model.lower()} built on {place}" for adjective, place in itertools.product(ADJECTIVES, PLACES)]
+        for model in MODELS
+    }
+    for i in range(1, counts["vehicle"] + 1):
+        model = rng.choice(MODELS)
+        yield (
+            i, f"Vehicle {i}", f"{model} {i % 100}", rng.randrange(1, 500), rng.choice(descriptions[model]),
+            f"https://swapi.dev/api/vehicles/{i}",
+        )
+
+
+def _favorites(counts, rng):
+    favorite_id = 0
+    columns = {"people_id": 2, "planet_id": 3, "vehicle_id": 4}
+    for user in range(1, counts["user"] + 1):
+        for k in range(counts["favorites"]):
+            favorite_id += 1
+            row = [favorite_id, user, None, None, None]
+            column, target = favorite_target(user, k, counts)
+            row[columns[column]] = target
+            yield row
+
+
+# model, columns in the order the generator yields them, generator
+TABLES = (
+    (User, ("id", "username", "name", "email", "subscription_date", "upgrade", "password"), _users),
+    (People, ("id", "full_name", "gender", "description", "height", "url"), _people),
+    (Planet, ("id", "name", "climate", "description", "population", "url"), _planets),
+    (Vehicle, ("id", "name", "model", "capacity", "description", "url"), _vehicles),
+    (Favorite, ("id", "user_id", "people_id", "planet_id", "vehicle_id"), _favorites),
+)
+
+
+def _chunks(model, columns, rows, dialect):
+    # Values converted as SQLAlchemy would (enum names, datetimes on SQLite, ...)
+    processors = []
+    for index, name in enumerate(columns):
+        column_type = model.__table__.c[name].type
+        processor = column_type.bind_processor(dialect)
+        if processor is not None:
+            if isinstance(column_type, Enum):
+                # A handful of distinct values, convert each one once
+                processor = {member: processor(member) for member in column_type.enum_class}.__getitem__
+            processors.append((index, processor))
+    chunk = []
+    for row in rows:
+        if processors:
+            row = list(row)
+            for index, processor in processors:
+                row[index] = processor(row[index])
+        chunk.append(row)
+        if len(chunk) == SEED_CHUNK:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _copy(cursor, table, columns, chunk):
+    data = io.StringIO()
+    csv.writer(data).writerows(chunk)
+    data.seek(0)
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    if hasattr(cursor, "copy_expert"):
+        cursor.copy_expert(sql, data)
+    else:
+        with cursor.copy(sql) as copy:
+            copy.write(data.getvalue())
+
+
+def _executemany(cursor, table, columns, chunk, paramstyle):
+    marker = "?" if paramstyle == "qmark" else "%s"
+    cursor.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join([marker] * len(columns))})", chunk)
+
+
+def _drop_secondary_objects(connection, tables):
+    """Drops the indexes (and SQLite triggers) that only speed up reads, returns the SQL to recreate them."""
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        names = ", ".join(f"'{table}'" for table in tables)
+        rows = connection.exec_driver_sql(
+            f"SELECT type, name, sql FROM sqlite_master WHERE type IN ('index', 'trigger') "
+            f"AND sql IS NOT NULL AND tbl_name IN ({names}) ORDER BY type"
+        ).all()
+    elif dialect == "postgresql":
+        rows = [("index", name, sql) for name, sql in connection.execute(text(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = current_schema() "
+            "AND tablename = ANY(:tables) AND indexname NOT IN (SELECT conname FROM pg_constraint)"
+        ), {"tables": list(tables)})]
+    else:
+        return []
+    for kind, name, _ in rows:
+        connection.exec_driver_sql(f'DROP {kind.upper()} "{name}"')
+    return [sql for _, _, sql in rows]
+
+
+def _rebuild_search(connection):
+    if connection.dialect.name == "sqlite":
+        for (name,) in connection.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE '%\\_fts' ESCAPE '\\'"
+        ).all():
+            connection.exec_driver_sql(f"INSERT INTO {name}({name}) VALUES ('rebuild')")
+
+
+def seed_catalog(users, people, planets, vehicles, favorites, reset=False, random_seed=42, echo=print):
+    counts = {"user": users, "people": people, "planet": planets, "vehicle": vehicles, "favorites": favorites}
+    if users and favorites and min(people, planets, vehicles) < -(-favorites // 3):
+        raise ValueError("Every user needs favorites / 3 distinct people, planets and vehicles")
+    rng = random.Random(random_seed)
+    tables = [model.__table__.name for model, _, _ in TABLES]
+    # Derived from favorite, emptied with the rest and recomputed after the load
+    derived = [FavoriteCounter.__table__.name]
+    start = time.perf_counter()
+    total = 0
+    with db.engine.begin() as connection:
+        dialect = connection.dialect
+        quote = dialect.identifier_preparer.quote
+        existing = sum(connection.execute(select(func.count()).select_from(model)).scalar() for model, _, _ in TABLES)
+        if existing and not reset:
+            raise ValueError(f"The tables already have {existing} rows, use --reset to replace them")
+        recreate = _drop_secondary_objects(connection, tables + derived)
+        if dialect.name == "postgresql":
+            connection.exec_driver_sql(f"TRUNCATE {', '.join(quote(table) for table in tables + derived)} RESTART IDENTITY CASCADE")
+        else:
+            connection.execute(FavoriteCounter.__table__.delete())
+            for model, _, _ in reversed(TABLES):
+                connection.execute(model.__table__.delete())
+        cursor = connection.connection.cursor()
+        for model, columns, generator in TABLES:
+            table_start = time.perf_counter()
+            rows = 0
+            for chunk in _chunks(model, columns, generator(counts, rng), dialect):
+                if dialect.name == "postgresql":
+                    _copy(cursor, quote(model.__table__.name), columns, chunk)
+                else:
+                    _executemany(cursor, quote(model.__table__.name), columns, chunk, dialect.paramstyle)
+                rows += len(chunk)
+            elapsed = time.perf_counter() - table_start
+            total += rows
+            echo(f"{model.__table__.name:<9} {rows:>10} rows in {elapsed:7.2f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s)")
+        cursor.close()
+
+        index_start = time.perf_counter()
+        rebuild_counters(connection)
+        for sql in recreate:
+            connection.exec_driver_sql(sql)
+        _rebuild_search(connection)
+        if dialect.name == "postgresql":
+            for table in tables:
+                connection.exec_driver_sql(
+                    f"SELECT setval(pg_get_serial_sequence('{quote(table)}', 'id'), "
+                    f"coalesce(max(id), 0) + 1, false) FROM {quote(table)}"
+                )
+        connection.exec_driver_sql("ANALYZE")
+        echo(f"indexes   rebuilt in {time.perf_counter() - index_start:7.2f}s")
+
+    elapsed = time.perf_counter() - start
+    table_versions.bump(*tables, *derived)
+    echo(f"total     {total:>10} rows in {elapsed:7.2f}s ({total / elapsed:,.0f} rows/s)")
+    return total
+
+
+@click.command("seed")
+@click.option("--users", default=1000, show_default=True, help="Users to create.")
+@click.option("--people", default=10000, show_default=True, help="People to create.")
+@click.option("--planets", default=1000, show_default=True, help="Planets to create.")
+@click.option("--vehicles", default=1000, show_default=True, help="Vehicles to create.")
+@click.option("--favorites", default=50, show_default=True, help="Favorites of every user.")
+@click.option("--reset", is_flag=True, help="Delete the rows already in those tables first.")
+@click.option("--random-seed", default=42, show_default=True, help="Same seed, same data.")
+@with_appcontext
+def seed_command(users, people, planets, vehicles, favorites, reset, random_seed):
+    """Fill the database with deterministic synthetic data."""
+    try:
+        seed_catalog(users, people, planets, vehicles, favorites, reset=reset, random_seed=random_seed, echo=click.echo)
+    except ValueError as err:
+        raise click.ClickException(str(err))
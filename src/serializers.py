@@ -0,0 +1,98 @@
+"""
+JSON provider and column driven serializers.
+
+The app uses orjson when it is installed and the standard library otherwise; both
+render datetimes as ISO-8601. Read-only list and detail endpoints select plain
+columns and turn each result row into a dict with RowSerializer, without building
+ORM objects.
+"""
+import enum
+import functools
+from datetime import date, datetime
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import DateTime, Enum, select
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    return DefaultJSONProvider.default(value)
+
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    default = staticmethod(_default)
+    sort_keys = False
+
+    def dumps_bytes(self, obj):
+        return self.dumps(obj).encode("utf-8")
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    sort_keys = False
+    option = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+    def dumps_bytes(self, obj):
+        return orjson.dumps(obj, default=_default, option=self.option)
+
+    def dumps(self, obj, **kwargs):
+        return self.dumps_bytes(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj), mimetype=self.mimetype)
+
+
+def json_provider_class():
+    return OrjsonProvider if orjson is not None else StdlibJSONProvider
+
+
+def _converter(column):
+    if isinstance(column.type, Enum) and column.type.enum_class is not None:
+        return lambda value: value.value if value is not None else None
+    if isinstance(column.type, DateTime):
+        return lambda value: value.isoformat() if value is not None else None
+    return None
+
+
+class RowSerializer:
+    """Selects the id plus the requested columns and converts result rows to dicts."""
+
+    def __init__(self, model, fields=None):
+        fields = fields or model.serialize_fields
+        names = list(dict.fromkeys(("id", *fields)))
+        self.columns = [getattr(model, name) for name in names]
+        # (output name, position in the row, converter) for every requested field
+        self.plan = [
+            (name, names.index(name), _converter(model.__table__.c[name]))
+            for name in fields
+        ]
+        self.plain = all(converter is None for _, _, converter in self.plan)
+
+    def select(self):
+        return select(*self.columns)
+
+    def __call__(self, row):
+        if self.plain:
+            return {name: row[index] for name, index, _ in self.plan}
+        return {
+            name: row[index] if converter is None else converter(row[index])
+            for name, index, converter in self.plan
+        }
+
+    def many(self, rows):
+        return [self(row) for row in rows]
+
+
+@functools.lru_cache(maxsize=256)
+def row_serializer(model, fields=None):
+    return RowSerializer(model, fields)
@@ -0,0 +1,155 @@
+"""
+Slow request log with the SQL the request ran.
+
+When a request takes longer than SLOW_REQUEST_MS (default 500, 0 turns it off), one
+JSON line is logged with the route, the timing, and every SQL statement it ran with
+its parameters and duration. The SLOW_QUERY_EXPLAIN_TOP slowest SELECTs (default 3)
+also get their plan (EXPLAIN on PostgreSQL, EXPLAIN QUERY PLAN on SQLite), taken
+on the same engine that ran them.
+
+The plans are taken once the response has been sent, so they never delay it. Lines
+go to the "slow_queries" logger, and also to the file in SLOW_QUERY_LOG when set.
+
+Parameters are logged as their type only ("<str>", "<int>"), the values of an INSERT
+into user would otherwise put passwords and emails in the log. SLOW_QUERY_PARAMETERS=1
+logs the values, for local debugging.
+"""
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from flask import g, request
+from metrics import track_requests, UNMATCHED_ROUTE
+
+logger = logging.getLogger("slow_queries")
+
+MAX_PARAMETERS_LENGTH = 2000
+
+
+def _placeholders(parameters):
+    if isinstance(parameters, dict):
+        return {name: _placeholders(value) for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_placeholders(value) for value in parameters]
+    return None if parameters is None else f"<{type(parameters).__name__}>"
+
+
+def _parameters(parameters, executemany, values=False):
+    if not values:
+        parameters = _placeholders(parameters)
+    if executemany and parameters and isinstance(parameters[0], (list, tuple, dict)):
+        # Only the first row of a bulk statement, the rest look alike
+        parameters = {"rows": len(parameters), "first": parameters[0]}
+    encoded = json.dumps(parameters, default=str)
+    if len(encoded) > MAX_PARAMETERS_LENGTH:
+        return encoded[:MAX_PARAMETERS_LENGTH] + "..."
+    return json.loads(encoded)
+
+
+def explain(engine, statement, parameters):
+    dialect = engine.dialect.name
+    if dialect == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    elif dialect in ("postgresql", "mysql", "mariadb"):
+        prefix = "EXPLAIN "
+    else:
+        return None
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql(prefix + statement, parameters).all()
+    if dialect == "sqlite":
+        return [row[-1] for row in rows]
+    if dialect == "postgresql":
+        return [row[0] for row in rows]
+    return [dict(row._mapping) for row in rows]
+
+
+class SlowQueryLog:
+    def __init__(self, app=None):
+        self.threshold = 0.5
+        self.explain_top = 3
+        self.log_values = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("SLOW_REQUEST_MS", int(os.getenv("SLOW_REQUEST_MS", 500)))
+        app.config.setdefault("SLOW_QUERY_EXPLAIN_TOP", int(os.getenv("SLOW_QUERY_EXPLAIN_TOP", 3)))
+        app.config.setdefault("SLOW_QUERY_LOG", os.getenv("SLOW_QUERY_LOG"))
+        app.config.setdefault(
+            "SLOW_QUERY_PARAMETERS", os.getenv("SLOW_QUERY_PARAMETERS", "0").lower() in ("1", "true", "yes", "on")
+        )
+        self.threshold = app.config["SLOW_REQUEST_MS"] / 1000
+        self.explain_top = app.config["SLOW_QUERY_EXPLAIN_TOP"]
+        self.log_values = app.config["SLOW_QUERY_PARAMETERS"]
+        if app.config["SLOW_QUERY_LOG"] and not logger.handlers:
+            handler = logging.FileHandler(app.config["SLOW_QUERY_LOG"])
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+        if self.threshold > 0:
+            track_requests(app)
+            app.before_request(self._before_request)
+            app.after_request(self._after_request)
+        app.extensions["slow_query_log"] = self
+
+    def _before_request(self):
+        g.request_stats.statements = []
+
+    @property
+    def enabled(self):
+        return self.threshold > 0
+
+    def _after_request(self, response):
+        stats = g.get("request_stats")
+        if stats is None or stats.statements is None:
+            return response
+        route = request.url_rule.rule if request.url_rule is not None else UNMATCHED_ROUTE
+        record = self.record(request.method, route, request.full_path.rstrip("?"), response.status_code, stats)
+        if record is not None:
+            statements = stats.statements
+            response.call_on_close(lambda: self.write(record, statements))
+        return response
+
+    def record(self, method, route, path, status, stats):
+        """Log line of a finished request, None when it was fast enough."""
+        elapsed = time.perf_counter() - stats.start
+        if elapsed < self.threshold:
+            return None
+        return {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "method": method,
+            "route": route,
+            "path": path,
+            "status": status,
+            "duration_ms": round(elapsed * 1000, 3),
+            "sql_count": stats.sql_statements,
+            "sql_ms": round(stats.sql_seconds * 1000, 3),
+        }
+
+    def write(self, record, statements):
+        worst = sorted(
+            (
+                index for index, (_, statement, _, executemany, _) in enumerate(statements)
+                if not executemany and statement.split(None, 1)[0].upper() in ("SELECT", "WITH")
+            ),
+            key=lambda index: statements[index][4],
+            reverse=True,
+        )[:self.explain_top]
+        record["statements"] = []
+        for index, (engine, statement, parameters, executemany, seconds) in enumerate(statements):
+            entry = {
+                "sql": statement,
+                "parameters": _parameters(parameters, executemany, self.log_values),
+                "duration_ms": round(seconds * 1000, 3),
+            }
+            if index in worst:
+                try:
+                    entry["explain"] = explain(engine, statement, parameters)
+                except Exception as err:
+                    entry["explain_error"] = str(err)
+            record["statements"].append(entry)
+        logger.warning(json.dumps(record, default=str))
+
+
+slow_query_log = SlowQueryLog()
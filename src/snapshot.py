@@ -0,0 +1,138 @@
+"""
+Opt-in in-memory snapshot of the reference catalogs (people, planet and vehicle).
+
+With CATALOG_SNAPSHOT=1 every worker loads the three tables when it starts and keeps
+each one as columns: the ids in an array, one tuple per field, an id -> offset index
+and the JSON of every row already encoded. The list and detail endpoints are then
+answered without SQL, a default page is just the pre-encoded rows joined together.
+
+A snapshot remembers the table version it was loaded at (see versions.py). When a
+request sees a newer version (a create, delete or bulk import made by any worker) the
+table is loaded again and swapped in with a single assignment. Requests arriving
+while another thread is loading are answered from the database, nobody waits for
+the load and no old row is served under the new ETag.
+"""
+import bisect
+import os
+import threading
+import time
+from array import array
+from flask import current_app, request
+from models import db, People, Planet, Vehicle
+from serializers import row_serializer
+from utils import get_page_size, get_cursor_id, encode_cursor, page_url
+from versions import table_versions
+
+SNAPSHOT_MODELS = (People, Planet, Vehicle)
+
+
+class TableSnapshot:
+    """Immutable copy of one table, never modified after it is built."""
+    __slots__ = ("version", "ids", "offsets", "columns", "encoded", "load_seconds")
+
+    def __init__(self, model, version, connection, dumps):
+        start = time.perf_counter()
+        serializer = row_serializer(model)
+        rows = [serializer(row) for row in connection.execute(serializer.select().order_by(model.id))]
+        self.version = version
+        self.ids = array("q", (row["id"] for row in rows))
+        self.offsets = {theid: offset for offset, theid in enumerate(self.ids)}
+        self.columns = {name: tuple(row[name] for row in rows) for name in model.serialize_fields}
+        self.encoded = [dumps(row) for row in rows]
+        self.load_seconds = time.perf_counter() - start
+
+    def _row(self, offset, fields):
+        return {name: self.columns[name][offset] for name in fields}
+
+    def response(self, theid, fields=None):
+        """JSON response with the row, or None when it does not exist."""
+        offset = self.offsets.get(theid)
+        if offset is None:
+            return None
+        payload = self.encoded[offset] if fields is None else current_app.json.dumps_bytes(self._row(offset, fields))
+        return current_app.response_class(payload, mimetype="application/json")
+
+    def page_response(self, fields=None):
+        """Same page and next link as utils.paginate, built from the snapshot."""
+        dumps = current_app.json.dumps_bytes
+        limit = get_page_size()
+        last_id = get_cursor_id(request.args)
+        start = 0 if last_id is None else bisect.bisect_right(self.ids, last_id)
+        end = start + limit
+        if fields is None:
+            results = b",".join(self.encoded[start:end])
+        else:
+            results = dumps([self._row(offset, fields) for offset in range(start, min(end, len(self.ids)))])[1:-1]
+        next_url = None
+        if end < len(self.ids):
+            args = request.args.to_dict()
+            args.update(cursor=encode_cursor([self.ids[end - 1]]), limit=limit)
+            next_url = page_url(args)
+        payload = b'{"results":[' + results + b'],"next":' + dumps(next_url) + b"}"
+        return current_app.response_class(payload, mimetype="application/json")
+
+    def stats(self):
+        return {"rows": len(self.ids), "version": self.version, "load_seconds": round(self.load_seconds, 3)}
+
+
+class CatalogSnapshot:
+    def __init__(self, models=SNAPSHOT_MODELS):
+        self.models = {model.__table__.name: model for model in models}
+        self.tables = {}
+        self._locks = {table: threading.Lock() for table in self.models}
+        self.loads = self.fallbacks = 0
+
+    def init_app(self, app):
+        app.config.setdefault(
+            "CATALOG_SNAPSHOT", os.getenv("CATALOG_SNAPSHOT", "0").lower() in ("1", "true", "yes", "on")
+        )
+        app.extensions["catalog_snapshot"] = self
+
+    def load(self, app):
+        """Loads every catalog, called when a worker starts so the first requests find them ready."""
+        if app.config["CATALOG_SNAPSHOT"]:
+            with app.app_context():
+                for table in self.models:
+                    with self._locks[table]:
+                        self._load(table)
+
+    def _load(self, table):
+        # The version is read first: a write landing during the load only causes one more reload
+        version = table_versions.get(table)
+        # Always from the primary, a lagging replica would tag old rows with the new version
+        with db.engine.connect() as connection:
+            snapshot = TableSnapshot(self.models[table], version, connection, current_app.json.dumps_bytes)
+        self.tables[table] = snapshot
+        self.loads += 1
+        return snapshot
+
+    def current(self, model):
+        """Snapshot of the table at its current version, None when the database has to answer."""
+        if not current_app.config["CATALOG_SNAPSHOT"]:
+            return None
+        table = model.__table__.name
+        snapshot = self.tables.get(table)
+        if snapshot is not None and snapshot.version == table_versions.get(table):
+            return snapshot
+        lock = self._locks[table]
+        if not lock.acquire(blocking=False):
+            self.fallbacks += 1
+            return None
+        try:
+            snapshot = self.tables.get(table)
+            if snapshot is None or snapshot.version != table_versions.get(table):
+                snapshot = self._load(table)
+            return snapshot
+        finally:
+            lock.release()
+
+    def stats(self):
+        return {
+            "enabled": current_app.config["CATALOG_SNAPSHOT"],
+            "loads": self.loads,
+            "fallbacks": self.fallbacks,
+            "tables": {table: snapshot.stats() for table, snapshot in self.tables.items()},
+        }
+
+
+catalog_snapshot = CatalogSnapshot()
@@ -0,0 +1,131 @@
+"""
+Cold start: what a worker does not pay for when it boots, and how to measure it.
+
+ENABLE_ADMIN chooses how Flask-Admin is mounted:
+
+    lazy (default)  on the first request to /admin, in a Flask app of its own because
+                    the main app cannot register blueprints once it served a request
+    1 / true        when the app is created
+    0 / false       never, /admin answers 404
+
+The `flask db` commands import Flask-Migrate and Alembic only when one of them runs.
+
+`flask startup-profile` imports the app in a fresh interpreter with -X importtime and
+lists the modules that take longest to import and initialize. With --budget-ms (or
+STARTUP_BUDGET_MS) it fails when the cold start goes over budget, for CI.
+"""
+import os
+import re
+import subprocess
+import sys
+import threading
+import click
+from flask import Flask
+from models import db
+
+TRUE_VALUES = ("1", "true", "yes", "on")
+FALSE_VALUES = ("0", "false", "no", "off")
+IMPORT_TIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|\s+(\S+)$", re.M)
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class LazyAdmin:
+    """WSGI middleware that builds the admin the first time /admin is requested."""
+
+    def __init__(self, app):
+        self.app = app
+        self.wsgi_app = app.wsgi_app
+        self.admin_app = None
+        self._lock = threading.Lock()
+
+    def _build(self):
+        from admin import setup_admin
+
+        admin_app = Flask(self.app.import_name)
+        admin_app.config.update(self.app.config)
+        db.init_app(admin_app)
+        setup_admin(admin_app)
+        return admin_app
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        if path != "/admin" and not path.startswith("/admin/"):
+            return self.wsgi_app(environ, start_response)
+        if self.admin_app is None:
+            with self._lock:
+                if self.admin_app is None:
+                    self.admin_app = self._build()
+        return self.admin_app(environ, start_response)
+
+
+def init_admin(app):
+    app.config.setdefault("ENABLE_ADMIN", os.getenv("ENABLE_ADMIN", "lazy"))
+    mode = str(app.config["ENABLE_ADMIN"]).lower()
+    if mode == "lazy":
+        app.wsgi_app = LazyAdmin(app)
+    elif mode in TRUE_VALUES:
+        from admin import setup_admin
+
+        setup_admin(app)
+    elif mode not in FALSE_VALUES:
+        raise ValueError("ENABLE_ADMIN must be lazy, 1 or 0")
+
+
+class LazyMigrate(click.Group):
+    """The `flask db` group, Flask-Migrate is set up when one of its commands is looked up."""
+
+    def __init__(self, app, db):
+        super().__init__("db", help="Perform database migrations.")
+        self.app = app
+        self.db = db
+        self._group = None
+
+    def _load(self):
+        if self._group is None:
+            from flask_migrate import Migrate
+            from flask_migrate.cli import db as db_group
+
+            Migrate(self.app, self.db)
+            self._group = db_group
+        return self._group
+
+    def list_commands(self, ctx):
+        return self._load().list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self._load().get_command(ctx, name)
+
+
+def profile_startup(module="wsgi"):
+    """(milliseconds to import module, [(module, self ms, cumulative ms), ...]) in a new interpreter."""
+    code = f"import time; start = time.perf_counter(); import {module}; print((time.perf_counter() - start) * 1000)"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], cwd=SRC_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise click.ClickException(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    modules = [
+        (name, int(self_us) / 1000, int(cumulative_us) / 1000)
+        for self_us, cumulative_us, name in IMPORT_TIME.findall(result.stderr)
+    ]
+    return float(result.stdout.strip().splitlines()[-1]), modules
+
+
+@click.command("startup-profile")
+@click.option("--module", default="wsgi", show_default=True, help="Module a worker imports.")
+@click.option("--runs", default=3, show_default=True, help="Cold starts measured, the fastest is reported.")
+@click.option("--top", default=20, show_default=True, help="Modules listed.")
+@click.option("--budget-ms", type=float, envvar="STARTUP_BUDGET_MS", show_envvar=True,
+              help="Fail when the cold start takes longer.")
+def startup_profile_command(module, runs, top, budget_ms):
+    """Import and init cost of the app per module, in a fresh interpreter."""
+    total, modules = min((profile_startup(module) for _ in range(max(runs, 1))), key=lambda run: run[0])
+    # A module's own time includes the code it runs at import, the init_app calls of app.py for example
+    click.echo(f"{'module':50} {'self ms':>9} {'total ms':>9}")
+    for name, self_ms, cumulative_ms in sorted(modules, key=lambda row: row[1], reverse=True)[:top]:
+        click.echo(f"{name:50} {self_ms:9.1f} {cumulative_ms:9.1f}")
+    click.echo(f"cold start: import {module} took {total:.1f} ms ({len(modules)} modules)")
+    if budget_ms is not None:
+        if total > budget_ms:
+            raise click.ClickException(f"over the startup budget of {budget_ms:.0f} ms")
+        click.echo(f"within the startup budget of {budget_ms:.0f} ms")
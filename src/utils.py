@@ -1,4 +1,31 @@
-from flask import jsonify, url_for
+import base64
+import binascii
+import enum
+import json
+import math
+import re
+from urllib.parse import urlencode
+from flask import jsonify, url_for, request
+from sqlalchemy import Enum, tuple_
+from models import db
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+RULE_PARAMETER = re.compile(r"<(?:(\w+)(?:\([^)]*\))?:)?(\w+)>")
+# ?population_gte=1000 -> population >= 1000, only on numeric columns
+RANGE_OPERATORS = {
+    "gt": lambda column, value: column > value,
+    "gte": lambda column, value: column >= value,
+    "lt": lambda column, value: column < value,
+    "lte": lambda column, value: column <= value,
+}
+# Label of the sort column added to the page query, the next cursor is read from it
+SORT_KEY = "sort_key"
+INVALID_CURSOR = "Invalid cursor, please use the 'next' link of a previous page"
+# Integer columns, ids and cursors are at most 64-bit, larger values never reach the database
+MIN_INTEGER, MAX_INTEGER = -2 ** 63, 2 ** 63 - 1
+# Characters url_for leaves unquoted in the query string, the next links must match it
+QUERY_SAFE = "!$'()*,/:;?@"
 
 class APIException(Exception):
     status_code = 400
@@ -15,11 +42,208 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise APIException("Invalid cursor, please use the 'next' link of a previous page", status_code=400)
+    if not isinstance(values, list) or not values:
+        raise APIException("Invalid cursor, please use the 'next' link of a previous page", status_code=400)
+    return values
+
+def get_page_size(default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE, args=None):
+    limit = (request.args if args is None else args).get("limit")
+    if limit is None:
+        return default
+    # isdecimal, not isdigit: "²" is a digit int() can not parse
+    if not limit.isdecimal() or not 1 <= int(limit) <= maximum:
+        raise APIException(f"limit must be an integer between 1 and {maximum}", status_code=400)
+    return int(limit)
+
+def get_fields(model, args=None):
+    # ?fields=id,name,url -> only those columns are selected and serialized
+    fields = (request.args if args is None else args).get("fields")
+    if fields is None:
+        return None
+    fields = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in fields if name not in model.serialize_fields]
+    if not fields or unknown:
+        raise APIException(f"fields must be a comma separated list of: {', '.join(model.serialize_fields)}", status_code=400)
+    return fields
+
+def _column_value(model, name, raw, param):
+    # The value of a query argument converted to the type of the column
+    column_type = model.__table__.c[name].type
+    if isinstance(column_type, Enum) and column_type.enum_class is not None:
+        for member in column_type.enum_class:
+            if raw.lower() in (member.value.lower(), member.name.lower()):
+                return member
+        raise APIException(
+            f"{param} must be one of: {', '.join(member.value for member in column_type.enum_class)}", status_code=400
+        )
+    python_type = column_type.python_type
+    if python_type is str:
+        return raw
+    try:
+        value = python_type(raw)
+    except ValueError:
+        value = None
+    if python_type is int and value is not None and not MIN_INTEGER <= value <= MAX_INTEGER:
+        raise APIException(f"{param} must be between {MIN_INTEGER} and {MAX_INTEGER}", status_code=400)
+    if value is None or (python_type is float and not math.isfinite(value)):
+        raise APIException(f"{param} must be {'an integer' if python_type is int else 'a number'}", status_code=400)
+    return value
+
+def get_filters(model, args=None):
+    """WHERE clauses of ?column=value and ?column_gte=value, validated against model.filter_fields."""
+    args = request.args if args is None else args
+    filter_fields = getattr(model, "filter_fields", ())
+    columns = model.__table__.c
+    clauses = []
+    for param, raw in args.items():
+        name, _, operator = param.rpartition("_")
+        if operator not in RANGE_OPERATORS or name not in columns:
+            name, operator = param, None
+        if name not in columns or name == "id":
+            # Not about a column (limit, cursor, fields, ...), nothing to filter
+            continue
+        if name not in filter_fields:
+            allowed = ", ".join(filter_fields) or "none"
+            raise APIException(f"{name} can not be used as a filter, the filters are: {allowed}", status_code=400)
+        column = getattr(model, name)
+        if operator is None:
+            clauses.append(column == _column_value(model, name, raw, param))
+        elif columns[name].type.python_type in (int, float):
+            clauses.append(RANGE_OPERATORS[operator](column, _column_value(model, name, raw, param)))
+        else:
+            raise APIException(f"{param}: {name} only accepts equality filters", status_code=400)
+    return clauses
+
+def get_sort(model, args=None):
+    """(column, descending) of ?sort=column or ?sort=-column, the primary key by default."""
+    sort = (request.args if args is None else args).get("sort")
+    if sort is None:
+        return model.id, False
+    name = sort.removeprefix("-")
+    sort_fields = ("id", *getattr(model, "filter_fields", ()))
+    if name not in sort_fields:
+        raise APIException(f"sort must be one of: {', '.join(sort_fields)}, with a leading - for descending", status_code=400)
+    return getattr(model, name), sort.startswith("-")
+
+def get_order(model, args=None):
+    column, descending = get_sort(model, args)
+    keys = [column] if column is model.id else [column, model.id]
+    return [key.desc() if descending else key for key in keys]
+
+def is_filtered(model, args=None):
+    """True when the page is not the plain ascending id order the snapshot holds."""
+    column, descending = get_sort(model, args)
+    return bool(get_filters(model, args)) or column is not model.id or descending
+
+
+def get_cursor_id(args):
+    """Id the page starts after, None on the first page."""
+    cursor = args.get("cursor")
+    if cursor is None:
+        return None
+    last_id = decode_cursor(cursor)[-1]
+    if isinstance(last_id, bool) or not isinstance(last_id, int) or not MIN_INTEGER <= last_id <= MAX_INTEGER:
+        raise APIException(INVALID_CURSOR, status_code=400)
+    return last_id
+
+def _cursor_values(model, args, column):
+    # [sort value, id] of the last row of the previous page ([id] when sorting by id)
+    last_id = get_cursor_id(args)
+    if last_id is None:
+        return None
+    if column is model.id:
+        return [last_id]
+    values = decode_cursor(args["cursor"])
+    if len(values) != 2 or isinstance(values[0], (list, dict)) or values[0] is None:
+        raise APIException(INVALID_CURSOR, status_code=400)
+    try:
+        value = _column_value(model, column.key, str(values[0]), "cursor")
+    except APIException:
+        raise APIException(INVALID_CURSOR, status_code=400)
+    return [value, last_id]
+
+def page_query(stmt, model, args):
+    # Keyset pagination on (sort column, id): every page is an index range scan
+    # of at most limit + 1 rows, no matter how deep the client goes.
+    limit = get_page_size(args=args)
+    stmt = stmt.where(*get_filters(model, args))
+    column, descending = get_sort(model, args)
+    keys = [model.id]
+    if column is not model.id:
+        keys = [column, model.id]
+        stmt = stmt.add_columns(column.label(SORT_KEY))
+    values = _cursor_values(model, args, column)
+    if values is not None:
+        # Row value comparison, the values take the types of the columns
+        position = tuple_(*keys) if len(keys) > 1 else keys[0]
+        after = tuple(values) if len(values) > 1 else values[0]
+        stmt = stmt.where(position < after if descending else position > after)
+    return stmt.order_by(*get_order(model, args)).limit(limit + 1), limit
+
+def next_page_args(rows, limit, args):
+    """Query arguments of the next page, None on the last one. rows is trimmed in place."""
+    if len(rows) <= limit:
+        return None
+    del rows[limit:]
+    last = rows[-1]
+    values = [last.id]
+    if SORT_KEY in last._fields:
+        sort_value = last._mapping[SORT_KEY]
+        values.insert(0, sort_value.name if isinstance(sort_value, enum.Enum) else sort_value)
+    args = dict(args)
+    args.update(cursor=encode_cursor(values), limit=limit)
+    return args
+
+def page_url(args):
+    """URL of the current route with args as its whole query string."""
+    # Not url_for(..., **args): a ?endpoint= or ?_external= argument would be taken as its own
+    path = url_for(request.endpoint, **(request.view_args or {}))
+    return f"{path}?{urlencode(args, safe=QUERY_SAFE)}"
+
+def paginate(stmt, model):
+    stmt, limit = page_query(stmt, model, request.args)
+    rows = db.session.execute(stmt).all()
+    args = next_page_args(rows, limit, request.args.to_dict())
+    next_url = page_url(args) if args is not None else None
+    return rows, next_url
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
     return len(defaults) >= len(arguments)
 
+def sitemap_routes(app):
+    """Every route with its methods and the converter and pattern of each parameter."""
+    routes = []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+        if rule.endpoint == "static":
+            continue
+        parameters = []
+        for converter, name in RULE_PARAMETER.findall(rule.rule):
+            converter = converter or "default"
+            parameters.append({
+                "name": name,
+                "converter": converter,
+                "pattern": getattr(app.url_map.converters[converter], "regex", None),
+            })
+        routes.append({
+            "path": request.script_root + rule.rule,
+            "endpoint": rule.endpoint,
+            "methods": sorted(rule.methods - {"HEAD", "OPTIONS"}),
+            "parameters": parameters,
+        })
+    return routes
+
 def generate_sitemap(app):
     links = ['/admin/']
     for rule in app.url_map.iter_rules():
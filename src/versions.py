@@ -0,0 +1,294 @@
+"""
+Per-table version counters and conditional GET support.
+
+Every commit that writes to a table bumps the version of that table. Responses
+built from those tables get an ETag made of their versions, so a client sending
+If-None-Match gets a 304 without the database or the serializers being touched.
+
+TABLE_VERSIONS_BACKEND chooses where the versions live:
+
+    file (default)  small files (one per table) in TABLE_VERSIONS_DIR, so every
+                    gunicorn worker on the host sees the writes made by the others.
+                    They are bumped right after the commit: only for a single host,
+                    a write made by another instance never moves them, and neither
+                    does one whose process dies between the commit and the bump.
+    database        the table_version table, updated in the same transaction as the
+                    write, for several instances. Reading the versions costs one
+                    primary key query on the primary per conditional request.
+
+The database backend serializes writers per table: the version row of every table a
+transaction touched is updated just before its commit and stays locked until the commit
+ends, so two concurrent writes to people take turns on that row (on SQLite the whole
+database is locked by the write anyway). It only widens each write by one UPDATE and the
+commit, but under a sustained write rate the commits of a table queue up. Use it for
+several instances with a low write rate, the read-mostly catalog this API serves; a
+single host, or a write-heavy one, is better off with the file backend. The bump stays
+in the transaction on purpose: bumping after the commit would leave the old ETag on
+new rows, answered with 304, whenever a process dies in between.
+
+With read replicas, a replica may not have a write yet when the version already moved,
+and its old rows would go out under the new ETag (and be answered with 304 until the
+next write). For READ_YOUR_WRITES_SECONDS after a table changes, the requests reading
+it go to the primary.
+"""
+import functools
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import uuid
+from flask import current_app, g, make_response, request
+from sqlalchemy import event, func, select, update, insert
+from sqlalchemy.exc import IntegrityError
+from models import db, TableVersion
+from replicas import replica_router
+
+try:
+    import fcntl
+except ImportError:  # Windows, only the in-process lock is used
+    fcntl = None
+
+BACKENDS = ("file", "database")
+
+
+class FileVersions:
+    transactional = False
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, table):
+        return os.path.join(self.directory, table)
+
+    def _read(self, table):
+        try:
+            with open(self._path(table)) as version_file:
+                return version_file.read()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, table, version):
+        # Write a new file and rename it so readers never see a partial version
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{table}-")
+        with os.fdopen(fd, "w") as version_file:
+            version_file.write(version)
+        os.replace(tmp_path, self._path(table))
+
+    def _locked(self, tables, increment):
+        with self._lock, open(os.path.join(self.directory, ".lock"), "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            versions = {}
+            for table in tables:
+                current = self._read(table)
+                if current is None:
+                    # A fresh epoch means an old ETag can never match after the files are lost
+                    epoch, counter = uuid.uuid4().hex[:12], 0
+                else:
+                    epoch, counter = current.split(":")
+                    counter = int(counter)
+                if increment or current is None:
+                    current = f"{epoch}:{counter + 1 if increment else counter}"
+                    self._write(table, current)
+                versions[table] = current
+            return versions
+
+    def get(self, tables):
+        versions = {table: self._read(table) for table in tables}
+        missing = [table for table, version in versions.items() if version is None]
+        if missing:
+            versions.update(self._locked(missing, increment=False))
+        return versions
+
+    def bump(self, tables):
+        return self._locked(tables, increment=True)
+
+    def changed_at(self, tables):
+        latest = 0.0
+        for table in tables:
+            try:
+                latest = max(latest, os.stat(self._path(table)).st_mtime)
+            except FileNotFoundError:
+                pass
+        return latest
+
+
+class DatabaseVersions:
+    # Versions are random tokens, not counters: a recreated database never repeats an old one
+    transactional = True
+
+    def _select(self, connection, tables):
+        rows = connection.execute(select(TableVersion.name, TableVersion.version).where(TableVersion.name.in_(tables)))
+        return dict(rows.all())
+
+    def write(self, connection, tables):
+        """Gives the tables a new version on connection, inside its transaction."""
+        version, now = uuid.uuid4().hex[:16], time.time()
+        connection.execute(
+            update(TableVersion).where(TableVersion.name.in_(tables)).values(version=version, changed_at=now)
+        )
+        missing = set(tables) - set(self._select(connection, tables))
+        if missing:
+            try:
+                with connection.begin_nested():
+                    connection.execute(insert(TableVersion), [
+                        {"name": table, "version": version, "changed_at": now} for table in missing
+                    ])
+            except IntegrityError:
+                # Another transaction created them meanwhile, update its rows instead
+                connection.execute(
+                    update(TableVersion).where(TableVersion.name.in_(missing)).values(version=version, changed_at=now)
+                )
+        return {table: version for table in tables}
+
+    def get(self, tables):
+        # Always on the primary, the versions of a lagging replica would hide the writes
+        with db.engine.connect() as connection:
+            versions = self._select(connection, tables)
+        missing = [table for table in tables if table not in versions]
+        if missing:
+            try:
+                with db.engine.begin() as connection:
+                    versions.update(self.write(connection, missing))
+            except IntegrityError:
+                with db.engine.connect() as connection:
+                    versions = self._select(connection, tables)
+        return versions
+
+    def bump(self, tables):
+        with db.engine.begin() as connection:
+            return self.write(connection, tables)
+
+    def changed_at(self, tables):
+        with db.engine.connect() as connection:
+            latest = connection.execute(
+                select(func.max(TableVersion.changed_at)).where(TableVersion.name.in_(tables))
+            ).scalar()
+        return latest or 0.0
+
+
+class TableVersions:
+    def __init__(self, app=None, session=None):
+        self.backend = None
+        self._listeners = []
+        if app is not None:
+            self.init_app(app, session)
+
+    def init_app(self, app, session):
+        app.config.setdefault("CACHE_CONTROL", os.getenv("CACHE_CONTROL", "no-cache"))
+        app.config.setdefault("TABLE_VERSIONS_BACKEND", os.getenv("TABLE_VERSIONS_BACKEND", "file"))
+        if app.config["TABLE_VERSIONS_BACKEND"] not in BACKENDS:
+            raise ValueError(f"TABLE_VERSIONS_BACKEND must be one of: {', '.join(BACKENDS)}")
+        if app.config["TABLE_VERSIONS_BACKEND"] == "database":
+            self.backend = DatabaseVersions()
+            event.listen(session, "before_commit", self._before_commit)
+        else:
+            directory = os.getenv("TABLE_VERSIONS_DIR")
+            if directory is None:
+                # One directory per database so two apps on the same host never share versions
+                database = hashlib.sha1(app.config["SQLALCHEMY_DATABASE_URI"].encode("utf-8")).hexdigest()[:12]
+                directory = os.path.join(tempfile.gettempdir(), f"table-versions-{database}")
+            # Local to the host: with several instances use TABLE_VERSIONS_BACKEND=database
+            app.config.setdefault("TABLE_VERSIONS_DIR", directory)
+            self.backend = FileVersions(app.config["TABLE_VERSIONS_DIR"])
+
+        event.listen(session, "after_flush", self._after_flush)
+        event.listen(session, "do_orm_execute", self._do_orm_execute)
+        event.listen(session, "after_commit", self._after_commit)
+        event.listen(session, "after_soft_rollback", self._after_rollback)
+        app.extensions["table_versions"] = self
+
+    def get(self, table):
+        return self.backend.get([table])[table]
+
+    def bump(self, *tables):
+        versions = self.backend.bump(sorted(set(tables)))
+        self._notify(versions)
+        return versions
+
+    def changed_at(self, tables):
+        """Time of the last bump of any of the tables, 0 when they were never bumped."""
+        return self.backend.changed_at(tables)
+
+    def on_bump(self, listener):
+        # Lets in-process caches drop their entries as soon as this worker writes
+        self._listeners.append(listener)
+
+    def _notify(self, tables):
+        for listener in self._listeners:
+            listener(*tables)
+
+    def etag(self, tables):
+        versions = self.backend.get(tables)
+        return "-".join(versions[table].replace(":", ".") for table in tables)
+
+    # Tables touched by the current transaction, bumped once it commits
+    def _touched(self, session):
+        return session.info.setdefault("touched_tables", set())
+
+    def _after_flush(self, session, flush_context):
+        touched = self._touched(session)
+        for instance in (*session.new, *session.dirty, *session.deleted):
+            touched.add(instance.__table__.name)
+
+    def _do_orm_execute(self, orm_execute_state):
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            self._touched(orm_execute_state.session).add(orm_execute_state.statement.table.name)
+
+    def _before_commit(self, session):
+        # Locks the version rows of the touched tables until the commit, see the module docstring
+        if session.in_nested_transaction():
+            return
+        # The pending changes are flushed first so every table they touch is known
+        session.flush()
+        touched = session.info.get("touched_tables")
+        if touched:
+            self.backend.write(session.connection(bind_arguments={"bind": db.engine}), sorted(touched))
+
+    def _after_commit(self, session):
+        # Also called when a savepoint is released, the tables wait for the real commit
+        if session.in_nested_transaction():
+            return
+        touched = session.info.pop("touched_tables", None)
+        if touched:
+            if self.backend.transactional:
+                self._notify(touched)
+            else:
+                self.bump(*touched)
+
+    def _after_rollback(self, session, previous_transaction):
+        if previous_transaction.parent is None:
+            session.info.pop("touched_tables", None)
+
+
+table_versions = TableVersions()
+
+
+def primary_after_write(tables):
+    """Sends the reads of this request to the primary while replicas may lag behind a write to tables."""
+    if replica_router.enabled and not g.get("primary_only", False):
+        if time.time() - table_versions.changed_at(tables) < replica_router.read_your_writes_seconds:
+            g.primary_only = True
+
+
+def conditional(*tables):
+    """Answers If-None-Match with a 304 when none of the tables changed since the client's copy."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = table_versions.etag(tables)
+            if etag in request.if_none_match:
+                response = current_app.response_class(status=304)
+            else:
+                primary_after_write(tables)
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = current_app.config["CACHE_CONTROL"]
+            return response
+        return wrapper
+    return decorator
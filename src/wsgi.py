@@ -2,6 +2,10 @@
 # Read more about it here: https://devcenter.heroku.com/articles/python-gunicorn
 
 from app import app as application
+from snapshot import catalog_snapshot
+
+# With CATALOG_SNAPSHOT=1 the catalogs are in memory before the first request
+catalog_snapshot.load(application)
 
 if __name__ == "__main__":
     application.run()
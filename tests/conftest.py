@@ -0,0 +1,34 @@
+"""
+The app is imported once, against a throwaway SQLite database and version directory,
+with the tables created from the models.
+"""
+import os
+import sys
+import tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+TMP_DIR = tempfile.mkdtemp(prefix="api-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP_DIR, 'test.db')}"
+os.environ["TABLE_VERSIONS_DIR"] = os.path.join(TMP_DIR, "versions")
+os.environ.pop("DATABASE_REPLICA_URLS", None)
+os.environ.setdefault("ENABLE_ADMIN", "0")
+os.environ.setdefault("CATALOG_SNAPSHOT", "0")
+os.environ.setdefault("SLOW_REQUEST_MS", "0")
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import app as flask_app
+    from models import db
+
+    with flask_app.app_context():
+        db.create_all()
+    yield flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,183 @@
+import asyncio
+import json
+import logging
+import threading
+import pytest
+import asgi
+from models import db, People, GenderEnum
+from metrics import request_metrics
+from slowlog import slow_query_log
+from versions import table_versions, DatabaseVersions
+
+
+async def call(path, query_string="", headers=()):
+    scope = {
+        "type": "http", "method": "GET", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": query_string.encode(), "headers": [(name.encode(), value.encode()) for name, value in headers],
+        "http_version": "1.1", "scheme": "http", "server": ("localhost", 80), "client": ("127.0.0.1", 1),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await asgi.app(scope, receive, send)
+    start = messages[0]
+    body = b"".join(message.get("body", b"") for message in messages[1:])
+    return start["status"], {name.decode(): value.decode() for name, value in start["headers"]}, body
+
+
+@pytest.fixture(params=["file", "database"])
+def versions_backend(app, request, monkeypatch):
+    if request.param == "database":
+        monkeypatch.setattr(table_versions, "backend", DatabaseVersions())
+    return request.param
+
+
+@pytest.fixture(scope="module")
+def people(app):
+    with app.app_context():
+        db.session.add_all([
+            People(full_name=f"asgi person {i}", gender=GenderEnum.MALE, description="-", height=1.8, url="-")
+            for i in range(3)
+        ])
+        db.session.commit()
+
+
+def test_native_list_matches_flask_and_revalidates(app, people, versions_backend):
+    async def run():
+        try:
+            first = await call("/people", "fields=id,full_name&limit=2")
+            again = await call("/people", "fields=id,full_name&limit=2", [("if-none-match", first[1]["etag"])])
+            return first, again
+        finally:
+            await asgi.database.dispose()
+
+    (status, headers, body), (again_status, _, again_body) = asyncio.run(run())
+    flask_response = app.test_client().get("/people?fields=id,full_name&limit=2")
+    assert status == 200
+    assert body == flask_response.data
+    assert headers["etag"] == flask_response.headers["ETag"]
+    assert again_status == 304 and again_body == b""
+
+
+def test_native_repeated_query_keys_keep_the_first(app, people):
+    async def run():
+        try:
+            return await call("/people", "fields=id&limit=1&limit=50")
+        finally:
+            await asgi.database.dispose()
+
+    status, _, body = asyncio.run(run())
+    assert status == 200
+    assert body == app.test_client().get("/people?fields=id&limit=1&limit=50").data
+
+
+class StreamingApp:
+    """WSGI app with a long streamed body that records how far it got and whether it was closed."""
+
+    def __init__(self, chunks=1000):
+        self.chunks = chunks
+        self.produced = 0
+        self.closed = threading.Event()
+
+    def __call__(self, environ, start_response):
+        start_response("200 OK", [("Content-Type", "application/x-ndjson")])
+        return self
+
+    def __iter__(self):
+        for _ in range(self.chunks):
+            self.produced += 1
+            yield b"{}\n"
+
+    def close(self):
+        self.closed.set()
+
+
+def wsgi_scope():
+    return {
+        "type": "http", "method": "GET", "path": "/people", "root_path": "", "query_string": b"format=ndjson",
+        "headers": [], "http_version": "1.1", "scheme": "http", "server": ("localhost", 80), "client": ("127.0.0.1", 1),
+    }
+
+
+def test_streamed_response_stops_when_send_fails(monkeypatch):
+    streaming = StreamingApp()
+    monkeypatch.setattr(asgi, "flask_app", streaming)
+
+    async def run():
+        gone = asyncio.Event()
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await gone.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message.get("body"):
+                gone.set()
+                raise OSError("connection reset")
+
+        with pytest.raises(OSError):
+            await asyncio.wait_for(asgi.call_wsgi(wsgi_scope(), receive, send), timeout=5)
+
+    asyncio.run(run())
+    assert streaming.closed.wait(5)
+    assert streaming.produced < streaming.chunks
+
+
+def test_streamed_response_stops_on_disconnect(monkeypatch):
+    streaming = StreamingApp()
+    monkeypatch.setattr(asgi, "flask_app", streaming)
+
+    async def run():
+        gone = asyncio.Event()
+        messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await gone.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message.get("body"):
+                # The client leaves and the server keeps accepting (and dropping) what is sent
+                gone.set()
+                await asyncio.sleep(0.01)
+
+        await asyncio.wait_for(asgi.call_wsgi(wsgi_scope(), receive, send), timeout=5)
+
+    asyncio.run(run())
+    assert streaming.closed.wait(5)
+    assert streaming.produced < streaming.chunks
+
+
+def test_native_requests_are_measured_and_logged(app, people, monkeypatch, caplog):
+    monkeypatch.setattr(slow_query_log, "threshold", 1e-9)
+    route = ("GET", "/people/<int:theid>")
+    before = request_metrics.requests.series.get((*route, "200"), 0)
+    sql_before = request_metrics.sql_statements.series.get(route, [0.0])[-1]
+
+    async def run():
+        try:
+            return await call("/people/1")
+        finally:
+            await asgi.database.dispose()
+
+    with caplog.at_level(logging.WARNING, logger="slow_queries"):
+        status, _, _ = asyncio.run(run())
+    assert status == 200
+    assert request_metrics.requests.series[(*route, "200")] == before + 1
+    # The statements of the async engine are counted for the request that ran them
+    assert request_metrics.sql_statements.series[route][-1] > sql_before
+    record = json.loads(caplog.records[-1].getMessage())
+    assert record["route"] == "/people/<int:theid>" and record["statements"]
+    assert "explain" in record["statements"][0]
@@ -0,0 +1,28 @@
+import json
+
+ROWS = [
+    {"name": "bulk planet ok", "description": "-", "url": "-", "population": 2 ** 31 - 1},
+    {"name": "bulk planet big", "description": "-", "url": "-", "population": 10 ** 30},
+    {"name": "bulk planet small", "description": "-", "url": "-", "population": -2 ** 31 - 1},
+]
+
+
+def post_lines(client, url, rows, raw_lines=()):
+    body = "\n".join([*(json.dumps(row) for row in rows), *raw_lines])
+    return client.post(url, data=body, content_type="application/x-ndjson")
+
+
+def test_bulk_rejects_integers_out_of_the_column_range(client):
+    response = post_lines(client, "/planets/bulk", ROWS)
+    summary = response.get_json()
+    assert summary["inserted"] == 1
+    assert summary["errors"] == 2
+    assert [row["line"] for row in summary["errors_rows"]] == [2, 3]
+
+
+def test_bulk_rejects_floats_out_of_range(client):
+    person = '{"full_name": "bulk person %s", "gender": "female", "description": "-", "url": "-", "height": %s}'
+    lines = [person % ("huge", 10 ** 400), person % ("inf", "1e400"), person % ("ok", "1.5")]
+    summary = post_lines(client, "/people/bulk", [], lines).get_json()
+    assert summary["inserted"] == 1
+    assert [row["line"] for row in summary["errors_rows"]] == [1, 2]
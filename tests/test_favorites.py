@@ -0,0 +1,57 @@
+from sqlalchemy import event
+from models import db, User, People, Planet, Vehicle, Favorite, GenderEnum
+
+MAX_STATEMENTS = 5
+
+
+def create_user_with_favorites(name, per_type):
+    user = User(username=name, name=name, email=f"{name}@example.com", password="secret")
+    people = [
+        People(full_name=f"{name} person {i}", gender=GenderEnum.FEMALE, description="-", height=1.7, url="-")
+        for i in range(per_type)
+    ]
+    planets = [Planet(name=f"{name} planet {i}", description="-", url="-") for i in range(per_type)]
+    vehicles = [Vehicle(name=f"{name} vehicle {i}", description="-", url="-") for i in range(per_type)]
+    favorites = [Favorite(user_item=user, people_item=item) for item in people]
+    favorites += [Favorite(user_item=user, planet_item=item) for item in planets]
+    favorites += [Favorite(user_item=user, vehicle_item=item) for item in vehicles]
+    db.session.add_all([user, *people, *planets, *vehicles, *favorites])
+    db.session.commit()
+    return user.id
+
+
+def get_counting_statements(app, url):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = app.test_client().get(url)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return response, statements
+
+
+def test_user_favorites_statements_do_not_grow_with_favorites(app):
+    with app.app_context():
+        few = create_user_with_favorites("few", 1)
+        many = create_user_with_favorites("many", 25)
+    # Warm up the pool and the lazy setup of the first request
+    app.test_client().get(f"/users/{few}/favorites")
+
+    few_response, few_statements = get_counting_statements(app, f"/users/{few}/favorites")
+    many_response, many_statements = get_counting_statements(app, f"/users/{many}/favorites")
+
+    assert few_response.status_code == 200 and len(few_response.json) == 3
+    assert many_response.status_code == 200 and len(many_response.json) == 75
+    assert len(few_statements) <= MAX_STATEMENTS, few_statements
+    assert len(many_statements) == len(few_statements), many_statements
+
+
+def test_user_favorites_unknown_user(client):
+    response = client.get("/users/999999/favorites")
+    assert response.status_code == 404
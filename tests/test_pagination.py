@@ -0,0 +1,35 @@
+from urllib.parse import parse_qs, urlsplit
+import pytest
+from models import db, Planet
+from utils import encode_cursor
+
+
+@pytest.fixture(scope="module")
+def planets(app):
+    with app.app_context():
+        db.session.add_all([Planet(name=f"page planet {i}", description="-", url="-") for i in range(3)])
+        db.session.commit()
+
+
+def test_next_link_keeps_arguments_named_like_url_for_options(client, planets):
+    response = client.get("/planets?limit=1&endpoint=x&_external=1&_anchor=a")
+    assert response.status_code == 200
+    next_url = urlsplit(response.get_json()["next"])
+    assert next_url.path == "/planets" and not next_url.scheme and not next_url.fragment
+    query = parse_qs(next_url.query)
+    assert query["endpoint"] == ["x"] and query["_external"] == ["1"] and query["_anchor"] == ["a"]
+    assert client.get(response.get_json()["next"]).status_code == 200
+
+
+@pytest.mark.parametrize("query", [
+    "limit=²",
+    "limit=0",
+    f"cursor={encode_cursor([2 ** 63])}",
+    f"cursor={encode_cursor([-2 ** 63 - 1])}",
+    f"cursor={encode_cursor([True])}",
+    f"population_gte={10 ** 30}",
+])
+def test_invalid_page_arguments_are_a_400(client, planets, query):
+    response = client.get(f"/planets?{query}")
+    assert response.status_code == 400
+    assert "message" in response.get_json()
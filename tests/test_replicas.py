@@ -0,0 +1,68 @@
+"""
+Replica routing against two SQLite files: the test database is the primary and a
+second file, holding one planet the primary does not have, plays the replica.
+"""
+import pytest
+from sqlalchemy import create_engine, insert
+from models import db, Planet
+from replicas import replica_router, PRIMARY_COOKIE
+from versions import table_versions
+
+REPLICA_ONLY = "/planets?climate=replica-only"
+
+
+@pytest.fixture
+def replica(app, tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'replica.db'}"
+    engine = create_engine(url)
+    db.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(Planet.__table__).values(
+            name="replica planet", climate="replica-only", description="-", url="-"
+        ))
+    engine.dispose()
+    monkeypatch.setattr(replica_router, "urls", [url])
+    monkeypatch.setattr(replica_router, "engines", [])
+    monkeypatch.setattr(replica_router, "health", {})
+    # No table was written lately unless a test says otherwise
+    monkeypatch.setattr(replica_router, "read_your_writes_seconds", 0)
+    yield monkeypatch
+    for engine in replica_router.engines:
+        engine.dispose()
+
+
+def names(response):
+    assert response.status_code == 200
+    return [planet["name"] for planet in response.get_json()["results"]]
+
+
+def test_reads_go_to_the_replica(client, replica):
+    assert names(client.get(REPLICA_ONLY)) == ["replica planet"]
+
+
+def test_writes_and_the_writer_reads_go_to_the_primary(app, client, replica):
+    replica.setattr(replica_router, "read_your_writes_seconds", 60)
+    response = client.post("/planets", json={"name": "primary planet", "description": "-", "url": "-"})
+    assert response.status_code == 201
+    assert client.get_cookie(PRIMARY_COOKIE) is not None
+    # Only the cookie keeps this client on the primary, not the table having changed
+    replica.setattr(table_versions, "changed_at", lambda tables: 0.0)
+    assert names(client.get(REPLICA_ONLY)) == []
+    with app.app_context():
+        assert db.session.query(Planet).filter_by(name="primary planet").count() == 1
+
+
+def test_reads_of_a_table_written_lately_go_to_the_primary(app, client, replica):
+    replica.setattr(replica_router, "read_your_writes_seconds", 60)
+    with app.app_context():
+        db.session.add(Planet(name="someone else's planet", description="-", url="-"))
+        db.session.commit()
+    # No cookie, but the planet table changed inside the window
+    assert client.get_cookie(PRIMARY_COOKIE) is None
+    assert names(client.get(REPLICA_ONLY)) == []
+
+
+def test_reads_fall_back_to_the_primary_when_the_replica_is_down(client, replica, tmp_path):
+    replica.setattr(replica_router, "urls", [f"sqlite:///{tmp_path / 'missing' / 'replica.db'}"])
+    assert names(client.get(REPLICA_ONLY)) == []
+    assert [replica["healthy"] for replica in replica_router.stats()] == [False]
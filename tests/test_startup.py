@@ -0,0 +1,31 @@
+import os
+import pytest
+from startup import profile_startup
+
+# About 600 ms on a laptop, CI can set its own with STARTUP_BUDGET_MS
+DEFAULT_BUDGET_MS = 800
+# Only loaded by /admin, the API docs and `flask db`, never by a booting worker
+DEFERRED_PACKAGES = ("flask_admin", "flask_swagger", "flask_migrate", "alembic")
+
+
+@pytest.fixture(scope="module")
+def cold_start():
+    # The default admin mode, not the ENABLE_ADMIN=0 of the other tests
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("ENABLE_ADMIN", "lazy")
+        return profile_startup("wsgi")
+
+
+def test_cold_start_within_budget(cold_start):
+    budget_ms = float(os.getenv("STARTUP_BUDGET_MS", DEFAULT_BUDGET_MS))
+    total_ms, modules = cold_start
+    slowest = sorted(modules, key=lambda row: row[1], reverse=True)[:5]
+    assert total_ms <= budget_ms, f"import wsgi took {total_ms:.0f} ms, slowest modules: {slowest}"
+
+
+def test_cold_start_defers_admin_docs_and_migrations(cold_start):
+    _, modules = cold_start
+    imported = {name for name, _, _ in modules}
+    assert imported, "the import profile listed no modules"
+    loaded = sorted(name for name in imported if name.split(".")[0] in DEFERRED_PACKAGES)
+    assert not loaded, f"import wsgi loaded {loaded}"